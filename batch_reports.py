@@ -0,0 +1,64 @@
+import os
+import sys
+import traceback
+from concurrent.futures import as_completed
+from read_data import open_data
+from report_site import write_index
+from warm_up import get_pool
+from compare_meal_response import compare_records, all_meals, interval
+
+
+def run_comparison(item, interval=240, root='html'):
+    ## errors are returned instead of raised so one bad comparison does not
+    ## stop the rest of the batch. The index page is written once by
+    ## run_batch when every worker is done.
+    fname = os.path.join(root, item['fname'])
+    try:
+        compare_records(item['meals'], fname, interval=interval, index=False)
+        return None
+    except Exception:
+        return traceback.format_exc()
+
+
+def run_batch(items, interval=240, workers=None, root='html'):
+    ## every user's data is built once here, before the workers start
+    users = sorted(set(meal[0] for item in items for meal in item['meals']))
+    failed = {}
+    for user in users:
+        try:
+            open_data(user)
+        except Exception:
+            failed[user] = traceback.format_exc()
+    if not os.path.exists(root):
+        os.makedirs(root)
+
+    errors = {}
+    with get_pool(workers) as pool:
+        futures = {}
+        for item in items:
+            missing = [m[0] for m in item['meals'] if m[0] in failed]
+            if missing:
+                errors[item['fname']] = failed[missing[0]]
+                continue
+            futures[pool.submit(run_comparison, item, interval,
+                                root)] = item
+        for n, future in enumerate(as_completed(futures)):
+            fname = futures[future]['fname']
+            try:
+                error = future.result()
+            except Exception:
+                error = traceback.format_exc()
+            if error is not None:
+                errors[fname] = error
+            print('[{}/{}] {} {}'.format(n + 1, len(futures), fname,
+                                        'failed' if error else 'done'))
+    write_index(root)
+
+    for fname, error in sorted(errors.items()):
+        sys.stderr.write('{} failed:\n{}\n'.format(fname, error))
+    return errors
+
+
+if __name__ == '__main__':
+    errors = run_batch(all_meals, interval=interval)
+    sys.exit(1 if errors else 0)
@@ -0,0 +1,247 @@
+import os
+import sys
+import gc
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import tracemalloc
+from datetime import timedelta
+import read_data
+from synthetic_data import generate_data
+
+## Times and memory profiles every stage of the pipeline on synthetic data
+## of several sizes, and compares the timings with a stored baseline.
+##
+##   python benchmark.py                  run and compare with the baseline
+##   python benchmark.py --save-baseline  run and store the results
+##
+## benchmarks/baseline.json holds a run on the development machine; timings
+## depend on the machine, so store a new baseline before comparing on
+## another one. A missing baseline is an error.
+
+baseline_file = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                'benchmarks', 'baseline.json')
+
+sizes = {
+    '2 weeks'             : {'n_users' : 4, 'days' : 14},
+    '3 months'            : {'n_users' : 4, 'days' : 90},
+    '1 year'              : {'n_users' : 2, 'days' : 365},
+    '3 months, gappy'     : {'n_users' : 4, 'days' : 90, 'n_gaps' : 60},
+    '3 months, scans'     : {'n_users' : 4, 'days' : 90,
+                             'scans_per_day' : 100},
+    '3 months, busy'      : {'n_users' : 4, 'days' : 90,
+                             'meals_per_day' : 8, 'activities_per_day' : 4},
+}
+quick_sizes = ['2 weeks', '3 months']
+
+
+def clear_caches(disk=False):
+    read_data.libre_store.clear()
+    read_data.store_cache.clear()
+    read_data.data_cache.clear()
+    if disk and os.path.exists(os.path.join('data', 'pkl')):
+        shutil.rmtree(os.path.join('data', 'pkl'))
+    if disk and os.path.exists('html'):
+        shutil.rmtree('html')
+
+
+def get_stages(users):
+    ## (name, setup, run) for every stage, run() is timed after setup()
+    inputs = {}
+
+    def read_all():
+        clear_caches()
+        for user in users:
+            read_data.read_cgm_data(read_data.libre_source['file'],
+                                    users[user]['start_date'],
+                                    users[user]['end_date'])
+
+    def prepare():
+        for user in users:
+            records = read_data.read_records(users[user]['records'])
+            records = read_data.process_records(records)
+            cgm_data = read_data.read_cgm_data(
+                            read_data.libre_source['file'],
+                            users[user]['start_date'], users[user]['end_date'])
+            cgm_data = cgm_data.sort_values('Time')
+            historic_gl = cgm_data['Historic Glucose (mmol/L)']
+            scan_gl = cgm_data['Scan Glucose (mmol/L)']
+            cgm_data['Glucose (mmol/L)'] = historic_gl.fillna(scan_gl)
+            segments = read_data.find_segments(cgm_data['Time'].values,
+                                               max_gap=timedelta(minutes=20))
+            gapped = read_data.insert_gap_breaks(
+                        cgm_data[['Time', 'Glucose (mmol/L)']], segments)
+            grid = read_data.expand_time(gapped, segments=segments)
+            inputs[user] = {'records' : records, 'cgm_data' : cgm_data,
+                            'segments' : segments, 'gapped' : gapped,
+                            'grid' : grid}
+
+    def each(func):
+        def run():
+            for user in users:
+                func(user, inputs[user])
+        return run
+
+    def plot_setup():
+        clear_caches(disk=True)
+        for user in users:
+            read_data.get_data(user)
+
+    def full_view():
+        from full_data_view import write_full_data_view
+        for user in users:
+            write_full_data_view(user)
+
+    def meal_compare():
+        from compare_meal_response import compare_records
+        from meal_windows import select_meals
+        for n, user in enumerate(users):
+            meals = select_meals(users=[user])[:4]
+            compare_records(meals, os.path.join('html', '{}.html'.format(n)),
+                                interval=240)
+
+    def nothing():
+        pass
+
+    def get_all():
+        for user in users:
+            read_data.get_data(user)
+
+    return [
+        ('read_cgm_data', nothing, read_all),
+        ('read_records', prepare, each(lambda user, data:
+                            read_data.read_records(users[user]['records']))),
+        ('process_records', nothing, each(lambda user, data:
+                            read_data.process_records(
+                                read_data.read_records(
+                                        users[user]['records'])))),
+        ('find_segments', nothing, each(lambda user, data:
+                            read_data.find_segments(
+                                data['cgm_data']['Time'].values))),
+        ('insert_gap_breaks', nothing, each(lambda user, data:
+                            read_data.insert_gap_breaks(
+                                data['cgm_data'][['Time',
+                                                  'Glucose (mmol/L)']],
+                                data['segments']))),
+        ('expand_time', nothing, each(lambda user, data:
+                            read_data.expand_time(data['gapped'],
+                                                segments=data['segments']))),
+        ('add_sleep_info', nothing, each(lambda user, data:
+                            read_data.add_sleep_info(data['grid'].copy(),
+                                                     data['records']))),
+        ('add_postprandial_info', nothing, each(lambda user, data:
+                            read_data.add_postprandial_info(
+                                data['grid'].copy(), data['records']))),
+        ('process_cgm_data', nothing, each(lambda user, data:
+                            read_data.process_cgm_data(
+                                data['cgm_data'].copy(), data['records']))),
+        ('get_data cold', lambda: clear_caches(disk=True), get_all),
+        ('get_data disk', clear_caches, get_all),
+        ('get_data memory', nothing, get_all),
+        ('full_data_view', plot_setup, full_view),
+        ('compare_records', plot_setup, meal_compare),
+    ]
+
+
+def measure(setup, run, repeat=3):
+    ## best wall time of repeat runs, then one traced run for peak memory
+    times = []
+    for n in range(repeat):
+        setup()
+        gc.collect()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    setup()
+    gc.collect()
+    tracemalloc.start()
+    run()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds' : min(times), 'peak_mb' : peak / 2.**20}
+
+
+def run_size(name, params, repeat=3):
+    root = tempfile.mkdtemp(prefix='cgm_benchmark_')
+    cwd = os.getcwd()
+    saved_config = dict(read_data.config)
+    try:
+        users = generate_data(root, seed=0, **params)
+        os.chdir(root)
+        read_data.config.update(users)
+        clear_caches()
+        results = {}
+        for stage, setup, run in get_stages(users):
+            results[stage] = measure(setup, run, repeat=repeat)
+            print('{:<18} {:<22} {:>9.4f} s {:>9.1f} MB'.format(
+                    name, stage, results[stage]['seconds'],
+                    results[stage]['peak_mb']))
+        return results
+    finally:
+        os.chdir(cwd)
+        read_data.config.clear()
+        read_data.config.update(saved_config)
+        clear_caches()
+        shutil.rmtree(root)
+
+
+def compare(results, baseline, tolerance):
+    ## stages slower than the baseline by more than tolerance (a fraction)
+    regressions = []
+    for name, stages in results.items():
+        for stage, result in stages.items():
+            if stage not in baseline.get(name, {}):
+                continue
+            before = baseline[name][stage]['seconds']
+            after = result['seconds']
+            if after > before * (1 + tolerance) and after - before > 0.005:
+                regressions.append((name, stage, before, after))
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description='Benchmark the cgm pipeline on synthetic data')
+    parser.add_argument('--quick', action='store_true',
+                        help='only the smaller data sizes')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--tolerance', type=float, default=0.5,
+                        help='allowed slowdown against the baseline')
+    parser.add_argument('--baseline', default=baseline_file)
+    parser.add_argument('--save-baseline', action='store_true')
+    parser.add_argument('--output', help='write the results as json')
+    args = parser.parse_args(argv)
+
+    names = quick_sizes if args.quick else list(sizes)
+    results = {}
+    for name in names:
+        results[name] = run_size(name, sizes[name], repeat=args.repeat)
+
+    if args.output:
+        with open(args.output, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+
+    if args.save_baseline:
+        if not os.path.exists(os.path.dirname(args.baseline)):
+            os.makedirs(os.path.dirname(args.baseline))
+        with open(args.baseline, 'w') as fd:
+            json.dump(results, fd, indent=2, sort_keys=True)
+        return 0
+
+    if not os.path.exists(args.baseline):
+        sys.stderr.write('no baseline at {}, run with --save-baseline\n'
+                            .format(args.baseline))
+        return 2
+    with open(args.baseline) as fd:
+        baseline = json.load(fd)
+    regressions = compare(results, baseline, args.tolerance)
+    for name, stage, before, after in regressions:
+        print('REGRESSION {} {}: {:.4f} s -> {:.4f} s'.format(name, stage,
+                                                            before, after))
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import os
+import json
+import hashlib
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+
+
+class LRUCache(object):
+
+    def __init__(self, maxsize=8):
+        self.maxsize = maxsize
+        self.items = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.items
+
+    def __getitem__(self, key):
+        value = self.items.pop(key)
+        self.items[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self.items.pop(key, None)
+        self.items[key] = value
+        while len(self.items) > self.maxsize:
+            self.items.popitem(last=False)
+
+    def clear(self):
+        self.items.clear()
+
+
+def has_copy_on_write():
+    if int(pd.__version__.split('.')[0]) >= 3:
+        return True
+    try:
+        return pd.get_option('mode.copy_on_write') is True
+    except KeyError:
+        return False
+
+
+def set_read_only(df):
+    ## marks the arrays behind df's columns, which shallow copies of it
+    ## share, read only
+    manager = getattr(df, '_mgr', None)
+    if manager is None:
+        manager = df._data
+    for block in manager.blocks:
+        if isinstance(block.values, np.ndarray):
+            block.values.flags.writeable = False
+
+
+def frame_view(df, copy=False):
+    ## every caller gets its own frame, so reassigning a column never
+    ## touches the cached one. Under pandas copy-on-write a shallow copy is
+    ## enough. Older pandas writes a reassigned column into the shared
+    ## array, so the cached arrays are made read only and such a write
+    ## raises instead; copy=True gives a deep copy to modify freely.
+    if copy:
+        return df.copy(deep=True)
+    if not has_copy_on_write():
+        set_read_only(df)
+    return df.copy(deep=False)
+
+
+file_digests = {}
+
+def file_digest(fname, blocksize=1 << 20):
+    ## content hash, recomputed only when mtime or size change
+    stat = os.stat(fname)
+    version = (stat.st_mtime, stat.st_size)
+    path = os.path.abspath(fname)
+    if path in file_digests and file_digests[path][0] == version:
+        return file_digests[path][1]
+
+    sha = hashlib.sha1()
+    with open(fname, 'rb') as fd:
+        for block in iter(lambda: fd.read(blocksize), b''):
+            sha.update(block)
+    file_digests[path] = (version, sha.hexdigest())
+    return file_digests[path][1]
+
+
+def get_cache_key(files, params):
+    sha = hashlib.sha1()
+    for fname in files:
+        sha.update(file_digest(fname).encode())
+    sha.update(json.dumps(params, sort_keys=True, default=str).encode())
+    return sha.hexdigest()[:16]
@@ -0,0 +1,217 @@
+import os
+import sys
+import argparse
+from datetime import datetime
+from collections import OrderedDict
+
+## One entry point for building the data and writing reports and tables:
+##
+##   python cli.py ingest [--user U ...] [--incremental] [--workers N]
+##   python cli.py full-view [--user U ...] [--start D] [--end D]
+##   python cli.py trends [--user U ...] [--start D] [--end D]
+##   python cli.py meal-compare --meal U:RECORD --meal U:RECORD ...
+##   python cli.py meal-compare --all [--workers N]
+##   python cli.py meal-search --meal U:RECORD [-k N] [--raw] [--dtw]
+##   python cli.py metrics [--user U ...] [--meals] [--compact]
+##                         [--output table.csv]
+##
+## Each command imports the modules it needs when it runs, so only the
+## reports pay for plotly and nothing is processed at import time.
+
+
+def parse_date(value):
+    for time_format in ['%Y-%m-%d %H:%M', '%Y-%m-%d']:
+        try:
+            return datetime.strptime(value, time_format)
+        except ValueError:
+            pass
+    raise argparse.ArgumentTypeError(
+                'expected YYYY-MM-DD or "YYYY-MM-DD HH:MM": {}'.format(value))
+
+
+def parse_meal(value):
+    user, _, record = value.rpartition(':')
+    if not user or not record.isdigit():
+        raise argparse.ArgumentTypeError(
+                'expected USER:RECORD_INDEX: {}'.format(value))
+    return (user, int(record))
+
+
+def get_users(args):
+    from read_data import config
+    return args.users or sorted(config)
+
+
+def run_ingest(args):
+    from warm_up import warm_up
+    errors = warm_up(get_users(args), workers=args.workers,
+                        incremental=args.incremental)
+    return 1 if errors else 0
+
+
+def run_full_view(args):
+    from full_data_view import write_full_data_view
+    for user in get_users(args):
+        write_full_data_view(user, start=args.start, end=args.end,
+                                root=args.output)
+        print('{} done'.format(user))
+    return 0
+
+
+def run_trends(args):
+    from glucose_trends import write_trends
+    for user in get_users(args):
+        write_trends(user, start=args.start, end=args.end, root=args.output)
+        print('{} done'.format(user))
+    return 0
+
+
+def run_meal_compare(args):
+    if args.all:
+        from compare_meal_response import all_meals
+        from batch_reports import run_batch
+        errors = run_batch(all_meals, interval=args.interval,
+                            workers=args.workers, root=args.output)
+        return 1 if errors else 0
+    if not args.meals:
+        sys.stderr.write('give --meal USER:RECORD at least once, or --all\n')
+        return 2
+    from compare_meal_response import compare_records
+    name = args.name or '_'.join('{}_{}'.format(user.replace(' ', '_'),
+                                                record)
+                                 for user, record in args.meals) + '.html'
+    compare_records(args.meals, os.path.join(args.output, name),
+                    interval=args.interval)
+    print(os.path.join(args.output, name))
+    return 0
+
+
+def run_meal_search(args):
+    from meal_search import load_index
+    index = load_index(interval=args.interval)
+    table = index.search(args.meal, k=args.k,
+                         mode='raw' if args.raw else 'normalized',
+                         metric='dtw' if args.dtw else 'euclidean',
+                         details=args.details)
+    print(table.to_string(index=False))
+    return 0
+
+
+def in_date_range(times, start, end):
+    import numpy as np
+    mask = np.ones(len(times), dtype=bool)
+    if start is not None:
+        mask &= times >= np.datetime64(start, 'ns')
+    if end is not None:
+        mask &= times <= np.datetime64(end, 'ns')
+    return mask
+
+
+def run_metrics(args):
+    users = get_users(args)
+    if args.meals:
+        from meal_windows import select_meals
+        from meal_metrics import get_meal_metrics
+        meals = select_meals(lambda records: in_date_range(
+                                records['Start'].values, args.start, args.end),
+                             users=users)
+        table = get_meal_metrics(meals, interval=args.interval)
+    else:
+        from variability import get_metrics
+        from compact import get_column
+        def get_subset(name):
+            def get_mask(cgm_data):
+                mask = in_date_range(get_column(cgm_data, 'Time'),
+                                     args.start, args.end)
+                if name != 'all':
+                    is_sleep = get_column(cgm_data, 'is_sleep')
+                    mask &= is_sleep if name == 'sleep' else ~is_sleep
+                return mask
+            return get_mask
+        subsets = [(name, get_subset(name))
+                   for name in ['all', 'sleep', 'awake']]
+        table = get_metrics(users, subsets=OrderedDict(subsets),
+                            compact=args.compact)
+    if args.output:
+        table.to_csv(args.output)
+    else:
+        print(table.to_string())
+    return 0
+
+
+def get_parser():
+    parser = argparse.ArgumentParser(
+                description='Build CGM data and write reports and tables')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    def add_command(name, run, help, users=True, dates=False, output=None):
+        command = commands.add_parser(name, help=help)
+        command.set_defaults(run=run)
+        if users:
+            command.add_argument('--user', dest='users', action='append',
+                                 help='a user from read_data.config, can be '
+                                      'repeated (default: every user)')
+        if dates:
+            command.add_argument('--start', type=parse_date)
+            command.add_argument('--end', type=parse_date)
+        if output is not None:
+            command.add_argument('--output', default=output,
+                                 help='output directory or file')
+        return command
+
+    command = add_command('ingest', run_ingest,
+                          'build the cached data of users')
+    command.add_argument('--incremental', action='store_true',
+                         help='extend caches of an older export')
+    command.add_argument('--workers', type=int,
+                         help='processes building users at once')
+
+    add_command('full-view', run_full_view, 'write the full data view',
+                dates=True, output='html')
+    add_command('trends', run_trends, 'write the sleep and weekday trends',
+                dates=True, output='html')
+
+    command = add_command('meal-compare', run_meal_compare,
+                          'compare the glucose response of meals',
+                          users=False, output='html')
+    command.add_argument('--meal', dest='meals', action='append',
+                         type=parse_meal, help='USER:RECORD, can be repeated')
+    command.add_argument('--name', help='report file name')
+    command.add_argument('--all', action='store_true',
+                         help='write every comparison in all_meals')
+    command.add_argument('--workers', type=int)
+    command.add_argument('--interval', type=int, default=240)
+
+    command = add_command('meal-search', run_meal_search,
+                          'meals with the most similar glucose response',
+                          users=False)
+    command.add_argument('--meal', required=True, type=parse_meal,
+                         help='USER:RECORD')
+    command.add_argument('-k', type=int, default=5)
+    command.add_argument('--raw', action='store_true',
+                         help='compare measured glucose, not the change '
+                              'from the meal start')
+    command.add_argument('--dtw', action='store_true',
+                         help='allow small shifts in time between curves')
+    command.add_argument('--details', help='text in Event_details')
+    command.add_argument('--interval', type=int, default=240)
+
+    command = add_command('metrics', run_metrics,
+                          'variability or post meal metrics table',
+                          dates=True, output='')
+    command.add_argument('--meals', action='store_true',
+                         help='one row per meal instead of per user')
+    command.add_argument('--interval', type=int, default=240)
+    command.add_argument('--compact', action='store_true',
+                         help='hold the grids compactly, glucose as float32')
+    return parser
+
+
+def main(argv=None):
+    args = get_parser().parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
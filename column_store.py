@@ -0,0 +1,149 @@
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from instrument import stage
+
+## A frame is stored as a directory with one raw binary file per column and
+## an index.json describing the dtypes. Text columns are stored as int32
+## codes with their categories kept in the index. Columns are opened as
+## read only memory maps, so reading a row range only touches its pages.
+
+
+def read_index(path):
+    with open(os.path.join(path, 'index.json')) as fd:
+        return json.load(fd)
+
+
+def write_index(path, index):
+    ## replaced in one step so readers never see a half written index
+    fname = os.path.join(path, 'index.json')
+    with open(fname + '.tmp', 'w') as fd:
+        json.dump(index, fd)
+    os.replace(fname + '.tmp', fname)
+
+
+def encode_column(values, column):
+    if values.dtype.kind not in 'biufmM':
+        categories = column.get('categories', [])
+        codes, new = pd.factorize(pd.Series(values).astype(object))
+        new = [str(c) for c in new]
+        lookup = {c : n for n, c in enumerate(categories)}
+        for c in new:
+            if c not in lookup:
+                lookup[c] = len(categories)
+                categories.append(c)
+        remap = np.array([lookup[c] for c in new] + [-1], dtype='int32')
+        column['categories'] = categories
+        values = remap[codes]
+    elif values.dtype.kind == 'M':
+        values = values.astype('datetime64[ns]')
+    if 'dtype' in column and values.dtype.str != column['dtype']:
+        values = values.astype(column['dtype'])
+    column['dtype'] = values.dtype.str
+    return np.ascontiguousarray(values)
+
+
+def get_tmp_path(path):
+    return '{}.{}.tmp'.format(path, os.getpid())
+
+
+def move_store(tmp_path, path):
+    ## rename a finished store into place, so other processes see either no
+    ## store or a complete one. If another process got there first its
+    ## store is kept and this one removed.
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        if not os.path.exists(path):
+            raise
+        shutil.rmtree(tmp_path)
+
+
+@stage
+def write_columns(path, df, meta=None):
+    tmp_path = get_tmp_path(path)
+    if os.path.exists(tmp_path):
+        shutil.rmtree(tmp_path)
+    os.makedirs(tmp_path)
+    index = {'length' : int(df.shape[0]), 'columns' : [], 'meta' : meta or {}}
+    for n, name in enumerate(df.columns):
+        column = {'name' : name, 'file' : '{}.bin'.format(n)}
+        values = encode_column(df[name].values, column)
+        values.tofile(os.path.join(tmp_path, column['file']))
+        index['columns'].append(column)
+    write_index(tmp_path, index)
+    move_store(tmp_path, path)
+
+
+@stage
+def append_columns(path, df):
+    ## add rows at the end, existing memory maps stay valid
+    index = read_index(path)
+    for column in index['columns']:
+        values = encode_column(df[column['name']].values, column)
+        with open(os.path.join(path, column['file']), 'ab') as fd:
+            values.tofile(fd)
+    index['length'] += int(df.shape[0])
+    write_index(path, index)
+
+
+@stage
+def replace_columns(path, df):
+    ## rewrite whole columns through a new file, never in place, since the
+    ## old one may still be memory mapped
+    index = read_index(path)
+    for column in index['columns']:
+        if column['name'] not in df.columns:
+            continue
+        values = encode_column(df[column['name']].values, column)
+        fname = os.path.join(path, column['file'])
+        values.tofile(fname + '.tmp')
+        os.replace(fname + '.tmp', fname)
+    write_index(path, index)
+
+
+def open_columns(path):
+    index = read_index(path)
+    columns = {}
+    for column in index['columns']:
+        dtype = np.dtype(column['dtype'])
+        fname = os.path.join(path, column['file'])
+        if index['length'] == 0:
+            columns[column['name']] = np.empty(0, dtype=dtype)
+        else:
+            columns[column['name']] = np.memmap(fname, dtype=dtype, mode='r',
+                                                shape=(index['length'],))
+    return index, columns
+
+
+def get_row_range(store, start=None, end=None, on='Time'):
+    ## rows with start <= on <= end, the column must be sorted
+    index, columns = store
+    first, last = 0, index['length']
+    if start is not None:
+        first = np.searchsorted(columns[on], np.datetime64(start, 'ns'),
+                                    side='left')
+    if end is not None:
+        last = np.searchsorted(columns[on], np.datetime64(end, 'ns'),
+                                    side='right')
+    return first, last
+
+
+@stage
+def read_columns(store, start=None, end=None, on='Time', names=None):
+    index, columns = store
+    first, last = get_row_range(store, start=start, end=end, on=on)
+    data = {}
+    names = names or [c['name'] for c in index['columns']]
+    for column in index['columns']:
+        if column['name'] not in names:
+            continue
+        values = np.array(columns[column['name']][first:last])
+        if 'categories' in column:
+            values = pd.Categorical.from_codes(values, column['categories'])
+            values = np.asarray(values.astype(object))
+        data[column['name']] = values
+    return pd.DataFrame(data, columns=names,
+                            index=pd.RangeIndex(first, last))
@@ -0,0 +1,93 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from intervals import as_datetime64
+from time_in_range import get_glucose_ranges
+
+## The minute grid from read_data.process_cgm_data in a fraction of the
+## memory: int32 minutes from a per-user epoch (midnight of the first day),
+## float32 glucose, the boolean labels as bits of one uint8 column, a small
+## integer segment number and optionally the glucose range as a categorical.
+## Glucose keeps float32 precision (about 7 digits), far finer than the
+## 0.1 mmol/L of the readings.
+
+flag_bits = OrderedDict([
+    ('original_data_point' , 1),
+    ('is_sleep'            , 2),
+    ('is_post_prandial'    , 4),
+    ('is_activity'         , 8),
+])
+grid_columns = ['Time', 'Glucose (mmol/L)', 'original_data_point', 'segment',
+                'is_sleep', 'is_post_prandial', 'is_activity']
+
+
+def get_epoch(times):
+    if len(times) == 0:
+        return np.datetime64(0, 'D')
+    return as_datetime64(times[:1]).astype('datetime64[D]')[0]
+
+
+def compact_cgm_data(cgm_data, epoch=None, thresholds=None):
+    ## cgm_data is a grid frame or a dict of its columns, e.g. the memory
+    ## mapped columns of a store from read_data.open_data
+    times = as_datetime64(cgm_data['Time'])
+    if epoch is None:
+        epoch = get_epoch(times)
+    epoch = np.datetime64(epoch, 'ns')
+    offsets = times - epoch
+    minute = np.timedelta64(1, 'm')
+    if (offsets % minute).any():
+        raise ValueError('times are not on a minute grid')
+
+    glucose = np.asarray(cgm_data['Glucose (mmol/L)'], dtype=np.float32)
+    data = OrderedDict([('Minute', (offsets // minute).astype(np.int32)),
+                        ('Glucose (mmol/L)', glucose)])
+    flags = np.zeros(times.shape[0], dtype=np.uint8)
+    for name, bit in flag_bits.items():
+        if name in cgm_data:
+            flags[np.asarray(cgm_data[name], dtype=bool)] |= bit
+    data['flags'] = flags
+    if 'segment' in cgm_data:
+        segment = np.asarray(cgm_data['segment'])
+        dtype = np.int16 if segment.max(initial=0) < 2**15 else np.int32
+        data['segment'] = segment.astype(dtype)
+    if thresholds is not None:
+        data['Glucose range'] = get_glucose_ranges(glucose, thresholds)
+
+    compact = pd.DataFrame(data)
+    compact.attrs['epoch'] = str(epoch)
+    compact.attrs['flags'] = [name for name in flag_bits if name in cgm_data]
+    return compact
+
+
+def get_times(compact, epoch=None):
+    epoch = np.datetime64(epoch or compact.attrs['epoch'], 'ns')
+    minutes = compact['Minute'].values.astype('timedelta64[m]')
+    return epoch + minutes.astype('timedelta64[ns]')
+
+
+def get_flag(compact, name):
+    return (compact['flags'].values & flag_bits[name]) > 0
+
+
+def get_column(cgm_data, name):
+    ## values of a grid column from a grid frame or a compact one, so the
+    ## analyses can take either
+    if name == 'Time' and 'Minute' in cgm_data:
+        return get_times(cgm_data)
+    if name in flag_bits and name not in cgm_data:
+        return get_flag(cgm_data, name)
+    return cgm_data[name].values
+
+
+def expand_cgm_data(compact, epoch=None):
+    ## the grid frame again, with glucose as float64 of the float32 values
+    data = OrderedDict([('Time', get_times(compact, epoch=epoch)),
+                        ('Glucose (mmol/L)',
+                         compact['Glucose (mmol/L)'].values.astype(float))])
+    for name in compact.attrs.get('flags', list(flag_bits)):
+        data[name] = get_flag(compact, name)
+    if 'segment' in compact:
+        data['segment'] = compact['segment'].values.astype(np.int64)
+    columns = [name for name in grid_columns if name in data]
+    return pd.DataFrame(data, columns=columns, index=compact.index)
@@ -0,0 +1,55 @@
+import numpy as np
+
+
+def get_line_points(cgm_data):
+    ## the minute grid is a linear interpolation between readings, so the
+    ## readings themselves draw the same line. The first valid minute after
+    ## each gap is kept too, since the grid is NaN at the reading there.
+    glucose = cgm_data['Glucose (mmol/L)'].values
+    missing = np.isnan(glucose)
+    after_gap = np.zeros(glucose.shape[0], dtype=bool)
+    after_gap[1:] = missing[:-1] & ~missing[1:]
+    keep = cgm_data['original_data_point'].values | after_gap
+    return cgm_data[keep]
+
+
+def minmax_downsample(y, n_buckets):
+    ## indices of the lowest and highest value of every bucket of
+    ## consecutive points, plus the first point of every run of NaNs so the
+    ## gaps still break the line
+    y = np.asarray(y, dtype=float)
+    n = y.shape[0]
+    if n <= 2 * n_buckets:
+        return np.arange(n)
+    index = np.arange(n)
+    bucket = index * n_buckets // n
+    valid = ~np.isnan(y)
+
+    vb, vy, vi = bucket[valid], y[valid], index[valid]
+    order = np.lexsort((vy, vb))
+    first = np.flatnonzero(np.diff(vb[order])) + 1
+    lows = vi[order[np.concatenate(([0], first))]]
+    highs = vi[order[np.concatenate((first - 1, [order.shape[0] - 1]))]]
+
+    gap_starts = np.flatnonzero(~valid & np.concatenate(([True], valid[:-1])))
+    return np.unique(np.concatenate((lows, highs, gap_starts)))
+
+
+def get_lod_data(cgm_data, max_points=4000):
+    ## lossless line points, reduced to per-bucket minima and maxima when
+    ## there are more than max_points of them
+    points = get_line_points(cgm_data)
+    if points.shape[0] <= max_points:
+        return points
+    keep = minmax_downsample(points['Glucose (mmol/L)'].values,
+                                max_points // 2)
+    return points.iloc[keep]
+
+
+def get_time_slice(cgm_data, start, end):
+    ## rows from start to end plus one point either side, so the line runs
+    ## to the edges of the range
+    times = cgm_data['Time'].values
+    first = max(np.searchsorted(times, np.datetime64(start, 'ns')) - 1, 0)
+    last = np.searchsorted(times, np.datetime64(end, 'ns'), side='right') + 1
+    return cgm_data.iloc[first:last]
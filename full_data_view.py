@@ -1,83 +1,103 @@
-import os
-from datetime import datetime, timedelta
-import numpy as np
-import pandas as pd
-import plotly.graph_objs as go
-from plotly.offline import plot
-from read_data import get_data, config
-
-
-def get_date_button(date):
-    label = date.strftime('%d %b')
-    date_range = [date, date + timedelta(1)]
-    return {'label'    : label,
-            'method'   : 'relayout',
-            'args'     : [{'xaxis' : {'range' : date_range}}]
-            }
-
-def get_records_plot(record, color='rgba( 179, 181, 194, 0.2)'):
-    time_step_size = timedelta(seconds=60)
-    x = np.arange(record['Start'], record['Finish'] + time_step_size,
-                    time_step_size)
-    y = [15]*x.shape[0]
-    record_plot = go.Scatter(
-            x=pd.Series(x),
-            y=y,
-            fill='tozeroy',
-            mode='none',
-            fillcolor=color,
-            text=[record['Event_details']]*x.shape[0],
-            hoverinfo='text',
-            showlegend=False
-    )
-    return record_plot
-
-
-user = 'Cher Wee'
-start_date = config[user]['start_date'] + timedelta(seconds=60*60*8)
-records, cgm_data = get_data(user)
-
-cgm_plot = go.Scatter(
-        x=cgm_data['Time'],
-        y=cgm_data['Glucose (mmol/L)'],
-        name='Glucose (mmol/L)',
-        hoverinfo='y',
-        line={'color': '#1f77b4'},
-        showlegend=False
-    )
-
-plot_data = [cgm_plot]
-
-record_plot_colors = {'Sleep'    : 'rgba( 179, 181, 194, 0.2)',
-                      'Meal'     : 'rgba( 85, 168, 104, 0.3)',
-                      'Activity' : 'rgba( 129, 114, 178, 0.2)'
-                     }
-for n, row in records.iterrows():
-    color = record_plot_colors[row['Event_type']]
-    plot_data.append(get_records_plot(row, color=color))
-
-
-buttons = [get_date_button(start_date + timedelta(days))
-                                    for days in range(13)]
-updatemenus=[{ 'buttons' : buttons }]
-
-layout = go.Layout(
-    xaxis={'range': [start_date, start_date + timedelta(1)]},
-    yaxis={'range': [2, 14],
-           'title' : 'Glucose (mmol/L)',
-           'hoverformat' : '.1f'
-          },
-    plot_bgcolor='rgba(0,0,0,0)',
-    updatemenus=updatemenus,
-    hoverdistance=1
-)
-
-fig = go.Figure(
-        data=plot_data,
-        layout=layout
-    )
-
-if not os.path.exists('html'):
-        os.mkdir('html')
-plot(fig, show_link=False,
-        filename=os.path.join('html', 'full_data_{}.html'.format(user)))
+import os
+from datetime import datetime, timedelta
+from read_data import get_data, get_data_keys, config
+from report_site import get_report_key, is_current, get_div, write_report
+from overlays import get_event_traces
+from intervals import RecordIndex
+from downsample import get_line_points, get_lod_data, get_time_slice
+
+
+def get_date_button(date):
+    ## shows the full resolution line in place of the overview
+    label = date.strftime('%d %b')
+    date_range = [date, date + timedelta(1)]
+    return {'label'    : label,
+            'method'   : 'update',
+            'args'     : [{'visible' : [False, True]},
+                          {'xaxis.range' : date_range},
+                          [0, 1]]
+            }
+
+
+def get_glucose_trace(cgm_data, visible=True):
+    import plotly.graph_objs as go
+    return go.Scatter(
+        x=cgm_data['Time'],
+        y=cgm_data['Glucose (mmol/L)'],
+        name='Glucose (mmol/L)',
+        hoverinfo='y',
+        line={'color': '#1f77b4'},
+        showlegend=False,
+        visible=visible
+    )
+
+
+def write_full_data_view(user, start=None, end=None, root='html'):
+    ## the whole period by default, days starting at 8 am
+    fname = os.path.join(root, 'full_data_{}.html'.format(user))
+    if start is not None or end is not None:
+        fname = os.path.join(root, 'full_data_{}_{}_{}.html'.format(user,
+                            *[d.strftime('%Y%m%d') if d is not None else ''
+                              for d in [start, end]]))
+    key = get_report_key({'user' : user, 'data' : get_data_keys(user)[1],
+                          'date_range' : [start, end]})
+    if is_current(fname, key):
+        return
+    import plotly.graph_objs as go
+    records, cgm_data = get_data(user)
+    if start is not None or end is not None:
+        cgm_data = get_time_slice(cgm_data, start or cgm_data['Time'].iloc[0],
+                                    end or cgm_data['Time'].iloc[-1])
+        records = RecordIndex(records).overlapping(cgm_data['Time'].iloc[0],
+                                                   cgm_data['Time'].iloc[-1])
+    start_date = start or (config[user]['start_date']
+                                + timedelta(seconds=60*60*8))
+
+    ## a downsampled overview of the whole period, and the full resolution
+    ## line shown when a day is selected. The buttons change only these two
+    ## traces, so they stay small however many days there are.
+    n_days = (cgm_data['Time'].iloc[-1] - start_date).days + 1
+    days = [start_date + timedelta(day) for day in range(n_days)]
+    plot_data = [get_glucose_trace(get_lod_data(cgm_data), visible=False),
+                 get_glucose_trace(get_line_points(cgm_data))]
+
+    record_plot_colors = {'Sleep'    : 'rgba( 179, 181, 194, 0.2)',
+                          'Meal'     : 'rgba( 85, 168, 104, 0.3)',
+                          'Activity' : 'rgba( 129, 114, 178, 0.2)'
+                         }
+    plot_data.extend(get_event_traces(records, record_plot_colors, 0, 15))
+
+    buttons = [{'label'    : 'All',
+                'method'   : 'update',
+                'args'     : [{'visible' : [True, False]},
+                              {'xaxis.range' : [days[0],
+                                                days[-1] + timedelta(1)]},
+                              [0, 1]]
+               }]
+    for day in days:
+        buttons.append(get_date_button(day))
+    updatemenus=[{ 'buttons' : buttons, 'active' : 1 }]
+
+    layout = go.Layout(
+        xaxis={'range': [start_date, start_date + timedelta(1)]},
+        yaxis={'range': [2, 14],
+               'title' : 'Glucose (mmol/L)',
+               'hoverformat' : '.1f'
+              },
+        plot_bgcolor='rgba(0,0,0,0)',
+        updatemenus=updatemenus,
+        ## the event hover points are 10 minutes apart, about 7 pixels when
+        ## a day is shown
+        hoverdistance=10
+    )
+
+    fig = go.Figure(
+            data=plot_data,
+            layout=layout
+        )
+
+    write_report(fname, get_div(fig), key)
+
+
+if __name__ == '__main__':
+    write_full_data_view('Cher Wee')
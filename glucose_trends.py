@@ -1,119 +1,129 @@
-import os
-import plotly.graph_objs as go
-from plotly.offline import plot
-from read_data import get_data, config
-
-def get_glucose_range(glucose):
-    if glucose < 2:
-        return '< 2 mmol/L'
-    th = [2, 4, 6, 8, 10, 20]
-    for i in range(len(th)-2):
-        if glucose < th[i+1]:
-            return '{0} - {1} mmol/L'.format(th[i], th[i+1])
-    return '> 10 mmol/L'
-
-
-
-def compare_data_subsets(data1, data1_name, data2, data2_name):
-
-    index = ['2 - 4 mmol/L', '4 - 6 mmol/L', '6 - 8 mmol/L',
-                  '8 - 10 mmol/L', '> 10 mmol/L']
-
-    glucose_vs_time1 = data1['glucose_range'].value_counts()
-    time_vs_range1 = glucose_vs_time1.loc[index].values/60.
-
-
-    glucose_vs_time2 = data2['glucose_range'].value_counts()
-    time_vs_range2 = glucose_vs_time2.loc[index].values/60.
-
-    bar1 = go.Bar(
-        x=index,
-        y=time_vs_range1 *100. / time_vs_range1.sum(),
-        name=data1_name
-    )
-    bar2 = go.Bar(
-        x=index,
-        y=time_vs_range2 *100. / time_vs_range2.sum(),
-        name=data2_name
-    )
-
-    plotbar_data = [bar1, bar2]
-
-
-    data1 = data1[data1['original_data_point']]
-    data2 = data2[data2['original_data_point']]
-
-    pp_map = {True: 'post prandial', False: 'baseline'}
-    x1 = data1['is_post_prandial'].map(pp_map)
-    x2 = data2['is_post_prandial'].map(pp_map)
-
-    box1 = go.Box(y=data1['Glucose (mmol/L)'],
-                    x=x1,
-                    marker={'size' : 2},
-                    boxpoints='outliers',
-                    jitter=0.2,
-                    name=data1_name
-                    )
-
-    box2 = go.Box(y=data2['Glucose (mmol/L)'],
-                    x=x2,
-                    marker={'size' : 2},
-                    boxpoints='outliers',
-                    jitter=0.2,
-                    name=data2_name
-                    )
-
-    plotbox_data = [box1, box2]
-
-    layout = go.Layout(
-                yaxis={
-                       'title' : 'Time (%)',
-                       'hoverformat': '.1f'
-                      },
-                plot_bgcolor='rgba(0,0,0,0)',
-                boxmode='group',
-                barmode='group',
-                bargap=0.15,
-                bargroupgap=0.1,
-                legend={'x'         : 0.98,
-                        'xanchor'   : 'right',
-                        'y'         : 0.98,
-                        'yanchor'   : 'top'
-                        },
-                )
-
-    figbar = go.Figure(data=plotbar_data, layout=layout)
-    if not os.path.exists('html'):
-        os.mkdir('html')
-    filename='{0}_{1}_vs_{2}_time.html'.format(user, data1_name, data2_name)
-    filename = os.path.join('html', filename)
-    plot(figbar, filename=filename, show_link=False,)
-
-
-    layout['yaxis']['title'] = 'Glucose (mmol/L)'
-    figbox = {'data'   : plotbox_data,
-              'layout' : layout,
-             }
-    filename='{0}_{1}_vs_{2}_glucose_box.html'.format(user, data1_name,
-                                                            data2_name)
-    filename = os.path.join('html', filename)
-    plot(figbox, filename=filename, show_link=False,)
-
-user = 'Praveen'
-records, cgm_data = get_data('Praveen')
-cgm_data['glucose_range'] = cgm_data['Glucose (mmol/L)'].apply(
-                                              get_glucose_range)
-
-## comparing sleeep time to awake time
-sleep_data = cgm_data[cgm_data['is_sleep']]
-awake_data = cgm_data[~cgm_data['is_sleep']]
-compare_data_subsets(sleep_data, 'sleep', awake_data, 'awake')
-
-
-## comparing weekday to weekend   -- ## excluding 16 and 17th
-batam = cgm_data['Time'].apply(lambda x: x.day in [16, 17])
-cgm_data = cgm_data[~batam]
-weekend = cgm_data['Time'].apply(lambda x: x.weekday() in [5, 6])
-weekend_data = cgm_data[weekend]
-weekday_data = cgm_data[~weekend]
-compare_data_subsets(weekday_data, 'weekday', weekend_data, 'weekend')
+import os
+from datetime import datetime
+import numpy as np
+from read_data import get_data, get_data_keys, get_cgm_window
+from report_site import get_report_key, is_current, get_div, write_report
+from strata import stratify, get_strata_codes, get_date_mask
+from compact import get_column
+
+## days left out of the weekday / weekend comparison (a trip to Batam)
+excluded_days = {'Praveen' : [datetime(2018, 6, 16), datetime(2018, 6, 17)]}
+
+def compare_data_subsets(user, cgm_data, factor, names, mask=None,
+                            date_range=None, root='html'):
+    ## names are two labels of a factor from strata.factors, e.g. 'sleep'
+    ## and 'awake' of 'sleep'
+    data1_name, data2_name = names
+    key = get_report_key({'user' : user,
+                          'data' : get_data_keys(user)[1],
+                          'subsets' : [data1_name, data2_name],
+                          'date_range' : date_range
+                         })
+    name = '{0}_{1}_vs_{2}'.format(user, data1_name, data2_name)
+    if date_range is not None and any(d is not None for d in date_range):
+        ## a date range gets its own reports, as in write_full_data_view
+        name = '{}_{}_{}'.format(name, *[d.strftime('%Y%m%d')
+                                         if d is not None else ''
+                                         for d in date_range])
+    time_file = os.path.join(root, '{}_time.html'.format(name))
+    box_file = os.path.join(root, '{}_glucose_box.html'.format(name))
+    if is_current(time_file, key) and is_current(box_file, key):
+        return
+    import plotly.graph_objs as go
+
+    time_vs_range = stratify(cgm_data, [factor], mask=mask)['Time (%)']
+    time_vs_range.index = time_vs_range.index.get_level_values(0)
+    index = list(time_vs_range.columns)
+
+    bar1 = go.Bar(
+        x=index,
+        y=time_vs_range.loc[data1_name].values,
+        name=data1_name
+    )
+    bar2 = go.Bar(
+        x=index,
+        y=time_vs_range.loc[data2_name].values,
+        name=data2_name
+    )
+
+    plotbar_data = [bar1, bar2]
+
+
+    codes, factor_names, labels = get_strata_codes(cgm_data, [factor])
+    original = get_column(cgm_data, 'original_data_point')
+    if mask is not None:
+        original = original & mask
+    mask1 = original & (codes == labels[0].index(data1_name))
+    mask2 = original & (codes == labels[0].index(data2_name))
+    glucose = get_column(cgm_data, 'Glucose (mmol/L)')
+    post_prandial = np.where(get_column(cgm_data, 'is_post_prandial'),
+                                'post prandial', 'baseline')
+    x1 = post_prandial[mask1]
+    x2 = post_prandial[mask2]
+
+    box1 = go.Box(y=glucose[mask1],
+                    x=x1,
+                    marker={'size' : 2},
+                    boxpoints='outliers',
+                    jitter=0.2,
+                    name=data1_name
+                    )
+
+    box2 = go.Box(y=glucose[mask2],
+                    x=x2,
+                    marker={'size' : 2},
+                    boxpoints='outliers',
+                    jitter=0.2,
+                    name=data2_name
+                    )
+
+    plotbox_data = [box1, box2]
+
+    layout = go.Layout(
+                yaxis={
+                       'title' : 'Time (%)',
+                       'hoverformat': '.1f'
+                      },
+                plot_bgcolor='rgba(0,0,0,0)',
+                boxmode='group',
+                barmode='group',
+                bargap=0.15,
+                bargroupgap=0.1,
+                legend={'x'         : 0.98,
+                        'xanchor'   : 'right',
+                        'y'         : 0.98,
+                        'yanchor'   : 'top'
+                        },
+                )
+
+    figbar = go.Figure(data=plotbar_data, layout=layout)
+    write_report(time_file, get_div(figbar), key)
+
+
+    layout['yaxis']['title'] = 'Glucose (mmol/L)'
+    figbox = {'data'   : plotbox_data,
+              'layout' : layout,
+             }
+    write_report(box_file, get_div(figbox), key)
+
+def write_trends(user, start=None, end=None, root='html'):
+    if start is None and end is None:
+        records, cgm_data = get_data(user)
+    else:
+        cgm_data = get_cgm_window(user, start, end)
+    date_range = [start, end]
+
+    ## comparing sleeep time to awake time
+    compare_data_subsets(user, cgm_data, 'sleep', ['sleep', 'awake'],
+                            date_range=date_range, root=root)
+
+
+    ## comparing weekday to weekend, without the excluded days
+    mask = get_date_mask(get_column(cgm_data, 'Time'),
+                            excluded_days.get(user, []))
+    compare_data_subsets(user, cgm_data, 'day_type', ['weekday', 'weekend'],
+                            mask=mask, date_range=date_range, root=root)
+
+
+if __name__ == '__main__':
+    write_trends('Praveen')
@@ -0,0 +1,103 @@
+import os
+import json
+import time
+import logging
+import functools
+import tracemalloc
+
+## Optional per stage profiling. Functions wrapped with @stage record wall
+## time, rows in and out and peak allocation while profiling is enabled,
+## and cost one flag check otherwise. Enable it with
+##
+##   CGM_PROFILE=1 python ...            one json log line per stage
+##   CGM_PROFILE=stages.jsonl python ... json lines appended to a file
+##
+## or from code with instrument.enable().
+
+logger = logging.getLogger('cgm.stages')
+settings = {'enabled' : False, 'fname' : None, 'memory' : True}
+frames = []
+
+
+def enable(fname=None, memory=True):
+    settings.update(enabled=True, fname=fname, memory=memory)
+    if not logger.handlers and not logging.getLogger().handlers:
+        logger.addHandler(logging.StreamHandler())
+    logger.setLevel(logging.INFO)
+
+
+def disable():
+    settings['enabled'] = False
+
+
+def count_rows(value):
+    if isinstance(value, tuple):
+        rows = [count_rows(v) for v in value]
+        return rows if any(r is not None for r in rows) else None
+    shape = getattr(value, 'shape', None)
+    if shape:
+        return int(shape[0])
+    return None
+
+
+def write_record(record):
+    line = json.dumps(record, sort_keys=True)
+    if settings['fname']:
+        with open(settings['fname'], 'a') as fd:
+            fd.write(line + '\n')
+    else:
+        logger.info(line)
+
+
+def run_stage(name, func, args, kwargs):
+    memory = settings['memory']
+    started = memory and not tracemalloc.is_tracing()
+    if started:
+        tracemalloc.start()
+    if memory:
+        current, peak = tracemalloc.get_traced_memory()
+        if frames:
+            frames[-1]['peak'] = max(frames[-1]['peak'], peak)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+        frames.append({'base' : current, 'peak' : current})
+
+    rows_in = None
+    for value in list(args) + list(kwargs.values()):
+        rows_in = count_rows(value)
+        if rows_in is not None:
+            break
+
+    start = time.perf_counter()
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        record = {'stage' : name,
+                  'seconds' : time.perf_counter() - start,
+                  'rows_in' : rows_in,
+                  'pid' : os.getpid()}
+        if memory:
+            frame = frames.pop()
+            peak = max(frame['peak'], tracemalloc.get_traced_memory()[1])
+            if frames:
+                frames[-1]['peak'] = max(frames[-1]['peak'], peak)
+            record['peak_mb'] = (peak - frame['base']) / 2.**20
+            if started:
+                tracemalloc.stop()
+    record['rows_out'] = count_rows(result)
+    write_record(record)
+    return result
+
+
+def stage(func):
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        if not settings['enabled']:
+            return func(*args, **kwargs)
+        return run_stage(func.__name__, func, args, kwargs)
+    return wrapper
+
+
+if os.environ.get('CGM_PROFILE'):
+    enable(fname=None if os.environ['CGM_PROFILE'] == '1'
+                            else os.environ['CGM_PROFILE'])
@@ -0,0 +1,201 @@
+import numpy as np
+import pandas as pd
+
+
+def as_datetime64(values):
+    return np.asarray(values).astype('datetime64[ns]')
+
+
+def label_intervals(times, starts, finishes):
+    ## the labels of the old row-by-row scan over sorted grid times: each
+    ## record flags the times after its start up to the first time after
+    ## its finish, but the scan never goes back, so a record starts where
+    ## the one before it left off. A record nested in an earlier one, or
+    ## starting with it, so still flags the time after where that one ended.
+    n = len(times)
+    m = len(starts)
+    if n == 0 or m == 0:
+        return np.zeros(n, dtype=bool)
+    after_start = np.searchsorted(times, starts, side='right')
+    after_finish = np.searchsorted(times, finishes, side='right')
+    ## the scan resumes at max(resume before, after_finish) + 1 after each
+    ## record, a running maximum once the steps are taken out
+    steps = np.arange(m)
+    resume = np.maximum.accumulate(np.maximum(after_finish - steps, 0))
+    resume = np.concatenate(([0], resume[:-1] + steps[1:]))
+    lo = np.maximum(resume, after_start)
+    hi = np.minimum(np.maximum(resume, after_finish), n - 1) + 1
+    keep = lo < hi
+    edges = (np.bincount(lo[keep], minlength=n + 1)
+                - np.bincount(hi[keep], minlength=n + 1))
+    return np.cumsum(edges[:n]) > 0
+
+
+def label_events(times, records, event_type, time_interval=None):
+    events = records[records['Event_type'] == event_type]
+    starts = as_datetime64(events['Start'].values)
+    if time_interval is None:
+        finishes = as_datetime64(events['Finish'].values)
+    else:
+        ## window of time_interval minutes after each event start
+        finishes = starts + np.timedelta64(time_interval, 'm')
+    return label_intervals(as_datetime64(times), starts, finishes)
+
+
+class IntervalSet(object):
+    ## sorted, disjoint closed intervals [start, finish]. Sets combine with
+    ## | & - and ~ (complement) as spans of time: intervals that only touch
+    ## at one instant do not intersect, and a difference or complement
+    ## keeps the boundary instants it was cut at.
+
+    def __init__(self, starts, finishes):
+        starts = as_datetime64(starts)
+        finishes = as_datetime64(finishes)
+        if len(starts) == 0:
+            self.starts = self.finishes = np.empty(0, dtype='datetime64[ns]')
+            return
+        order = np.argsort(starts, kind='mergesort')
+        starts, finishes = starts[order], finishes[order]
+        ## merge overlapping intervals: a new one starts wherever the start
+        ## comes after every earlier finish
+        ends = np.maximum.accumulate(finishes)
+        new = np.ones(len(starts), dtype=bool)
+        new[1:] = starts[1:] > ends[:-1]
+        first = np.where(new)[0]
+        last = np.append(first[1:], len(starts)) - 1
+        self.starts = starts[first]
+        self.finishes = ends[last]
+
+    def __len__(self):
+        return len(self.starts)
+
+    def contains(self, times):
+        ## mask of the times inside any interval, O(log n) per time
+        times = as_datetime64(times)
+        if len(self) == 0:
+            return np.zeros(times.shape, dtype=bool)
+        i = np.searchsorted(self.starts, times, side='right') - 1
+        return (i >= 0) & (times <= self.finishes[np.maximum(i, 0)])
+
+    def overlapping(self, start, finish):
+        ## positions of the intervals overlapping [start, finish]
+        first = np.searchsorted(self.finishes, np.datetime64(start, 'ns'),
+                                    side='left')
+        last = np.searchsorted(self.starts, np.datetime64(finish, 'ns'),
+                                    side='right')
+        return np.arange(first, max(first, last))
+
+    def combine(self, other, rule):
+        ## sweep over the boundaries of both sets, keeping the spans where
+        ## rule(in self, in other) holds
+        bounds = np.concatenate((self.starts, self.finishes,
+                                 other.starts, other.finishes))
+        if len(bounds) == 0:
+            return IntervalSet([], [])
+        times, position = np.unique(bounds, return_inverse=True)
+        n = len(self)
+        m = len(other)
+        deltas = np.concatenate((np.ones(n), -np.ones(n),
+                                 np.ones(m), -np.ones(m)))
+        in_self = np.bincount(position[:2 * n], deltas[:2 * n],
+                              minlength=len(times)).cumsum() > 0
+        in_other = np.bincount(position[2 * n:], deltas[2 * n:],
+                               minlength=len(times)).cumsum() > 0
+        keep = rule(in_self, in_other)[:-1]
+        return IntervalSet(times[:-1][keep], times[1:][keep])
+
+    def __or__(self, other):
+        return self.combine(other, lambda a, b: a | b)
+
+    def __and__(self, other):
+        return self.combine(other, lambda a, b: a & b)
+
+    def __sub__(self, other):
+        return self.combine(other, lambda a, b: a & ~b)
+
+    def __invert__(self):
+        ## everything outside the set, within the datetime64 range
+        lowest = np.datetime64(np.iinfo(np.int64).min + 1, 'ns')
+        highest = np.datetime64(np.iinfo(np.int64).max, 'ns')
+        return IntervalSet([lowest], [highest]) - self
+
+    def to_frame(self):
+        return pd.DataFrame({'Start' : self.starts,
+                             'Finish' : self.finishes},
+                            columns=['Start', 'Finish'])
+
+
+class RecordIndex(object):
+    ## records from read_data.process_records sorted by start, with the
+    ## running maximum of the finishes, so finding the records overlapping
+    ## a window is two binary searches plus the matches themselves
+
+    def __init__(self, records):
+        order = np.argsort(as_datetime64(records['Start'].values),
+                            kind='mergesort')
+        self.records = records.iloc[order]
+        self.starts = as_datetime64(self.records['Start'].values)
+        self.finishes = as_datetime64(self.records['Finish'].values)
+        self.max_finishes = np.maximum.accumulate(self.finishes) \
+                                if len(order) else self.finishes
+        types = self.records['Event_type'].values
+        self.by_type = {event_type : np.where(types == event_type)[0]
+                        for event_type in pd.unique(types)}
+
+    def positions(self, event_types=None):
+        ## sorted positions of the records of the given type(s)
+        if event_types is None:
+            return np.arange(len(self.starts))
+        if isinstance(event_types, str):
+            event_types = [event_types]
+        empty = np.empty(0, dtype=np.int64)
+        return np.sort(np.concatenate([empty] + [self.by_type.get(t, empty)
+                                                  for t in event_types]))
+
+    def overlapping(self, start, finish, event_types=None):
+        ## records with start <= Finish and Start <= finish
+        start = np.datetime64(start, 'ns')
+        first = np.searchsorted(self.max_finishes, start, side='left')
+        last = np.searchsorted(self.starts, np.datetime64(finish, 'ns'),
+                                    side='right')
+        found = np.arange(first, max(first, last))
+        found = found[self.finishes[found] >= start]
+        if event_types is not None:
+            found = np.intersect1d(found, self.positions(event_types))
+        return self.records.iloc[found]
+
+    def starting(self, start, finish, event_types=None):
+        ## records with start <= Start <= finish
+        positions = self.positions(event_types)
+        starts = self.starts[positions]
+        first = np.searchsorted(starts, np.datetime64(start, 'ns'),
+                                    side='left')
+        last = np.searchsorted(starts, np.datetime64(finish, 'ns'),
+                                    side='right')
+        return self.records.iloc[positions[first:last]]
+
+    def next_event(self, time, event_types='Meal'):
+        ## the first record starting after time, None if there is none
+        positions = self.positions(event_types)
+        i = np.searchsorted(self.starts[positions], np.datetime64(time, 'ns'),
+                                side='right')
+        if i == len(positions):
+            return None
+        return self.records.iloc[positions[i]]
+
+    def events(self, event_types, time_interval=None):
+        ## IntervalSet of the records of the given type(s); with
+        ## time_interval the time_interval minutes after each start, as for
+        ## the post prandial labels
+        positions = self.positions(event_types)
+        starts = self.starts[positions]
+        if time_interval is None:
+            finishes = self.finishes[positions]
+        else:
+            finishes = starts + np.timedelta64(time_interval, 'm')
+        return IntervalSet(starts, finishes)
+
+    def during(self, times, event_types, time_interval=None):
+        ## mask of the times during any record of the given type(s)
+        return self.events(event_types,
+                            time_interval=time_interval).contains(times)
@@ -0,0 +1,88 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from read_data import open_data, read_columns
+from meal_windows import select_meals, extract_meal_columns
+
+## One row of post meal response metrics per meal, computed on the windows
+## of all meals at once. The baseline is the glucose at the meal start, as
+## in the normalized view of compare_meal_response. Metrics over a span
+## that has missing glucose are NaN rather than computed across the gap.
+
+
+def get_incremental_auc(minutes, glucose, baseline, interval):
+    ## trapezoid area above the baseline from the start to interval minutes,
+    ## in mmol/L x min
+    span = (minutes >= 0) & (minutes <= interval)
+    above = np.maximum(glucose[:, span] - baseline[:, None], 0)
+    return ((above[:, 1:] + above[:, :-1]) / 2).sum(axis=1)
+
+
+def get_meal_metrics(meals=None, interval=240, auc_intervals=(120, 240)):
+    ## meals are (user, record index) pairs as from select_meals, all meals
+    ## of all users by default
+    if meals is None:
+        meals = select_meals()
+    interval = max([interval] + list(auc_intervals))
+    names = ['Glucose (mmol/L)', 'is_activity', 'is_sleep']
+    minutes, windows = extract_meal_columns(meals, names, interval=interval)
+    glucose = windows['Glucose (mmol/L)']
+    missing = np.isnan(glucose)
+    n = len(meals)
+
+    baseline = glucose[:, 0]
+    rows = np.arange(n)
+    peak_at = np.where(missing, -np.inf, glucose).argmax(axis=1)
+    peak = glucose[rows, peak_at]
+
+    ## first minute after the peak back at or below the baseline, with no
+    ## missing glucose up to it
+    back = ((minutes[None, :] > minutes[peak_at][:, None])
+                & (glucose <= baseline[:, None]))
+    back_at = back.argmax(axis=1)
+    first_missing = np.where(missing.any(axis=1), missing.argmax(axis=1),
+                             minutes.shape[0])
+    found = back[rows, back_at] & (back_at < first_missing)
+    back_at = np.where(found, minutes[back_at], np.nan)
+
+    data = OrderedDict()
+    data['User'] = [user for user, index in meals]
+    data['Record'] = [index for user, index in meals]
+    data['Start'], data['Event_details'] = get_meal_records(meals)
+    data['Baseline (mmol/L)'] = baseline
+    data['Peak (mmol/L)'] = peak
+    data['Time to peak (min)'] = minutes[peak_at].astype(float)
+    for auc_interval in auc_intervals:
+        span = minutes <= auc_interval
+        auc = get_incremental_auc(minutes, glucose, baseline, auc_interval)
+        auc[missing[:, span].any(axis=1)] = np.nan
+        data['iAUC {} (mmol/L x min)'.format(auc_interval)] = auc
+    data['Time to baseline (min)'] = back_at
+    span = minutes < interval
+    for name, column in [('is_activity', 'Activity'), ('is_sleep', 'Sleep')]:
+        data['{} overlap (min)'.format(column)] = np.nansum(
+                                            windows[name][:, span], axis=1)
+    data['Missing (min)'] = missing[:, span].sum(axis=1)
+
+    table = pd.DataFrame(data, columns=list(data))
+    ## the peak is only known from a complete window
+    incomplete = missing.any(axis=1)
+    table.loc[incomplete, ['Peak (mmol/L)', 'Time to peak (min)']] = np.nan
+    return table
+
+
+def get_meal_records(meals):
+    starts = np.empty(len(meals), dtype='datetime64[ns]')
+    details = np.empty(len(meals), dtype=object)
+    by_user = OrderedDict()
+    for row, (user, index) in enumerate(meals):
+        by_user.setdefault(user, []).append((row, index))
+    for user, items in by_user.items():
+        rows = np.array([row for row, index in items])
+        indices = np.array([index for row, index in items])
+        key, (records_store, cgm_store) = open_data(user)
+        records = read_columns(records_store,
+                               names=['Start', 'Event_details'])
+        starts[rows] = records['Start'].values[indices]
+        details[rows] = records['Event_details'].values[indices]
+    return starts, details
@@ -0,0 +1,226 @@
+import os
+import glob
+import shutil
+import numpy as np
+import pandas as pd
+from numpy.lib.stride_tricks import sliding_window_view
+import meal_windows
+from cache import get_cache_key
+from column_store import write_columns, open_columns
+from read_data import get_data_keys, open_data, read_columns, config
+from meal_windows import select_meals, extract_meal_windows
+
+## Finds the meals whose glucose response looks most like a given meal's.
+## Every meal's window is resampled once into a row of a curve matrix;
+## a query is then a few array operations over all rows. 'normalized'
+## compares the curves shifted to start at the same glucose, as in the
+## Normalized frame of compare_meal_response, 'raw' as measured.
+## load_index keeps the matrix in data/pkl next to the column stores, so
+## only users whose data changed are resampled again.
+
+
+def fill_missing(curves):
+    ## linear interpolation over missing points of each row, the ends are
+    ## held at the nearest value
+    filled = curves.copy()
+    steps = np.arange(curves.shape[1])
+    for row in np.where(np.isnan(curves).any(axis=1))[0]:
+        valid = ~np.isnan(curves[row])
+        if valid.any():
+            filled[row] = np.interp(steps, steps[valid], curves[row, valid])
+    return filled
+
+
+def get_dtw_distances(curves, query, band=3):
+    ## dynamic time warping of query against every row at once, with the
+    ## warping path kept within band steps of the diagonal; only the previous
+    ## row of the cost table is kept
+    n = curves.shape[1]
+    previous = np.full((curves.shape[0], n + 1), np.inf)
+    previous[:, 0] = 0
+    for i in range(1, n + 1):
+        current = np.full_like(previous, np.inf)
+        for j in range(max(1, i - band), min(n, i + band) + 1):
+            step = np.minimum(np.minimum(previous[:, j], current[:, j - 1]),
+                              previous[:, j - 1])
+            current[:, j] = (curves[:, j - 1] - query[i - 1]) ** 2 + step
+        previous = current
+    return np.sqrt(previous[:, n] / n)
+
+
+def get_dtw_lower_bounds(curves, query, band=3):
+    ## LB_Keogh: every point of a row is matched to a query point within
+    ## band steps, so its distance to the query's envelope there is a lower
+    ## bound of its share of the warping cost
+    windows = sliding_window_view(np.pad(query, band, mode='edge'),
+                                  2 * band + 1)
+    upper = windows.max(axis=1)
+    lower = windows.min(axis=1)
+    excess = (np.maximum(curves - upper, 0) ** 2
+              + np.maximum(lower - curves, 0) ** 2)
+    return np.sqrt(excess.sum(axis=1) / query.shape[0])
+
+
+class MealIndex(object):
+
+    def __init__(self, interval=240, step=5, min_coverage=0.8):
+        self.interval = interval
+        self.step = step
+        self.min_coverage = min_coverage
+        self.minutes = np.arange(0, interval + 1, step)
+        self.meals = []
+        self.details = np.empty(0, dtype=object)
+        self.curves = np.empty((0, self.minutes.shape[0]))
+        self.coverage = np.empty(0)
+        self.keys = {}
+
+    def update(self, users=None):
+        ## (re)builds the rows of users whose cached data changed since the
+        ## last update, the other rows are kept as they are. Rows of users
+        ## no longer in config are dropped.
+        gone = [user for user in self.keys if user not in config]
+        if gone:
+            keep = np.array([m[0] in config for m in self.meals], dtype=bool)
+            self.meals = [m for m, k in zip(self.meals, keep) if k]
+            self.details = self.details[keep]
+            self.coverage = self.coverage[keep]
+            self.curves = self.curves[keep]
+            for user in gone:
+                del self.keys[user]
+        for user in users or sorted(config):
+            key = get_data_keys(user)[1]
+            if self.keys.get(user) == key:
+                continue
+            keep = np.array([m[0] != user for m in self.meals], dtype=bool)
+            meals = select_meals(users=[user])
+            windows = extract_meal_windows(meals, interval=self.interval)
+            curves = windows.glucose[:, ::self.step]
+            key, (records_store, cgm_store) = open_data(user)
+            records = read_columns(records_store, names=['Event_details'])
+            details = records['Event_details'].values[
+                                        [index for _, index in meals]]
+
+            self.meals = [m for m, k in zip(self.meals, keep) if k] + meals
+            self.details = np.concatenate((self.details[keep], details))
+            self.coverage = np.concatenate((self.coverage[keep],
+                                    (~np.isnan(curves)).mean(axis=1)))
+            self.curves = np.vstack((self.curves[keep],
+                                     fill_missing(curves)))
+            self.keys[user] = key
+        return self
+
+    def get_paths(self):
+        ## (code key, store path); the path changes with the data keys
+        code_key = get_cache_key([__file__, meal_windows.__file__],
+                                 {'interval' : self.interval,
+                                  'step' : self.step})
+        return code_key, os.path.join('data', 'pkl', 'meal_index_{}_{}'.format(
+                                    code_key, get_cache_key([], self.keys)))
+
+    def get_curve_columns(self):
+        return ['Glucose {} min'.format(m) for m in self.minutes]
+
+    def save(self):
+        ## the index as a column store; the stores of older data with the
+        ## same code and parameters are removed
+        code_key, path = self.get_paths()
+        if os.path.exists(path):
+            return
+        frame = pd.DataFrame(self.curves, columns=self.get_curve_columns())
+        frame.insert(0, 'User', [m[0] for m in self.meals])
+        frame.insert(1, 'Record', np.array([m[1] for m in self.meals],
+                                            dtype=np.int64))
+        frame.insert(2, 'Event_details', self.details)
+        frame.insert(3, 'Coverage', self.coverage)
+        write_columns(path, frame, meta={'keys' : self.keys})
+        for old in glob.glob(os.path.join('data', 'pkl',
+                                          'meal_index_{}_*'.format(code_key))):
+            if old != path and not old.endswith('.tmp'):
+                shutil.rmtree(old)
+
+    def load(self):
+        ## the most recent store built by the same code and parameters
+        code_key, path = self.get_paths()
+        paths = [p for p in glob.glob(os.path.join(
+                            'data', 'pkl', 'meal_index_{}_*'.format(code_key)))
+                    if not p.endswith('.tmp')
+                    and os.path.exists(os.path.join(p, 'index.json'))]
+        if not paths:
+            return self
+        store = open_columns(max(paths, key=os.path.getmtime))
+        frame = read_columns(store)
+        self.meals = list(zip(frame['User'].tolist(),
+                              frame['Record'].tolist()))
+        self.details = frame['Event_details'].values.astype(object)
+        self.coverage = frame['Coverage'].values
+        self.curves = frame[self.get_curve_columns()].values
+        self.keys = store[0]['meta']['keys']
+        return self
+
+    def search(self, meal, k=5, mode='normalized', metric='euclidean',
+                details=None, band=3):
+        ## the k meals most like meal, a (user, record index) pair already in
+        ## the index; details keeps only meals whose Event_details contain
+        ## the text
+        if tuple(meal) not in self.meals:
+            raise ValueError('meal is not in the index: {}'.format(meal))
+        row = self.meals.index(tuple(meal))
+        if self.coverage[row] == 0:
+            raise ValueError('no glucose data after meal: {}'.format(meal))
+        curves = self.curves
+        if mode == 'normalized':
+            curves = curves - curves[:, :1]
+        elif mode != 'raw':
+            raise ValueError('mode is raw or normalized: {}'.format(mode))
+
+        candidates = self.coverage >= self.min_coverage
+        candidates[row] = False
+        if details is not None:
+            candidates &= pd.Series(self.details).str.contains(
+                            details, case=False, regex=False).values
+        rows = np.where(candidates)[0]
+
+        if metric == 'euclidean':
+            distances = np.sqrt(((curves[rows] - curves[row]) ** 2)
+                                    .mean(axis=1))
+        elif metric == 'dtw':
+            ## the straight path is one of the warping paths, so the k best
+            ## euclidean rows bound the k-th best warping distance; only rows
+            ## whose lower bound is below it are warped
+            query = curves[row]
+            distances = np.sqrt(((curves[rows] - query) ** 2).mean(axis=1))
+            if rows.shape[0] > k:
+                best = np.argpartition(distances, k)[:k]
+                limit = get_dtw_distances(curves[rows[best]], query,
+                                          band=band).max()
+                bounds = get_dtw_lower_bounds(curves[rows], query, band=band)
+                warp = bounds <= limit
+            else:
+                warp = np.ones(rows.shape[0], dtype=bool)
+            distances[~warp] = np.inf
+            distances[warp] = get_dtw_distances(curves[rows[warp]], query,
+                                                band=band)
+        else:
+            raise ValueError('metric is euclidean or dtw: {}'.format(metric))
+
+        if rows.shape[0] > k:
+            best = np.argpartition(distances, k)[:k]
+        else:
+            best = np.arange(rows.shape[0])
+        best = best[np.argsort(distances[best], kind='mergesort')]
+        return pd.DataFrame({
+                    'User' : [self.meals[r][0] for r in rows[best]],
+                    'Record' : [self.meals[r][1] for r in rows[best]],
+                    'Event_details' : self.details[rows[best]],
+                    'Distance (mmol/L)' : distances[best]},
+                    columns=['User', 'Record', 'Event_details',
+                             'Distance (mmol/L)'])
+
+
+def load_index(users=None, interval=240, step=5, min_coverage=0.8):
+    ## the saved index brought up to date with the users' data
+    index = MealIndex(interval=interval, step=step,
+                      min_coverage=min_coverage).load()
+    index.update(users)
+    index.save()
+    return index
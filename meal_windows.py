@@ -0,0 +1,66 @@
+from collections import namedtuple, OrderedDict
+import numpy as np
+from intervals import as_datetime64
+from read_data import open_data, read_columns, config
+
+## glucose[i, j] is meal i's glucose at minutes[j] after the meal started,
+## missing[i, j] marks gaps and times outside the user's data
+MealWindows = namedtuple('MealWindows', ['meals', 'minutes', 'glucose',
+                                         'missing'])
+
+
+def select_meals(predicate=None, users=None):
+    ## (user, record index) of every Meal record, optionally filtered by a
+    ## predicate taking the records frame and returning a boolean mask
+    meals = []
+    for user in users or sorted(config):
+        key, (records_store, cgm_store) = open_data(user)
+        records = read_columns(records_store)
+        mask = (records['Event_type'] == 'Meal').values
+        if predicate is not None:
+            mask = mask & np.asarray(predicate(records), dtype=bool)
+        meals.extend((user, int(i)) for i in np.where(mask)[0])
+    return meals
+
+
+def extract_meal_columns(meals, names, interval=240, before=0):
+    ## name -> one row per meal of the grid column at minutes -before ..
+    ## interval from the meal start, as float with NaN outside the data
+    minutes = np.arange(-before, interval + 1)
+    windows = OrderedDict((name, np.full((len(meals), minutes.shape[0]),
+                                         np.nan))
+                          for name in names)
+
+    by_user = OrderedDict()
+    for row, (user, index) in enumerate(meals):
+        by_user.setdefault(user, []).append((row, index))
+
+    for user, items in by_user.items():
+        rows = np.array([row for row, index in items])
+        indices = np.array([index for row, index in items])
+        key, (records_store, cgm_store) = open_data(user)
+        records = read_columns(records_store, names=['Start'])
+        index, columns = cgm_store
+        if index['length'] == 0:
+            continue
+        times = columns['Time']
+
+        ## the grid has one point per minute from its first time, so the
+        ## first point at or after each start is a direct offset
+        starts = as_datetime64(records['Start'].values[indices])
+        offsets = (starts - times[0]) / np.timedelta64(1, 'm')
+        positions = np.ceil(offsets).astype(int)[:, None] + minutes[None, :]
+        inside = (positions >= 0) & (positions < times.shape[0])
+        positions = np.clip(positions, 0, times.shape[0] - 1)
+        for name in names:
+            windows[name][rows] = np.where(inside, columns[name][positions],
+                                           np.nan)
+
+    return minutes, windows
+
+
+def extract_meal_windows(meals, interval=240, before=0):
+    minutes, windows = extract_meal_columns(meals, ['Glucose (mmol/L)'],
+                                            interval=interval, before=before)
+    glucose = windows['Glucose (mmol/L)']
+    return MealWindows(meals, minutes, glucose, np.isnan(glucose))
@@ -0,0 +1,108 @@
+import logging
+import numpy as np
+import pandas as pd
+
+## Records are drawn as one filled trace of rectangles per event type, so
+## the figure size grows with the number of events more than with their
+## duration. Hover text sits on invisible markers along each event, at its
+## start, its finish and every hover_step minutes between.
+
+logger = logging.getLogger('cgm.overlays')
+
+## for event types missing from the colors given to get_event_traces
+default_color = 'rgba( 127, 127, 127, 0.2)'
+
+
+def get_x_values(values):
+    values = np.asarray(values)
+    if values.dtype.kind == 'M':
+        return np.array(list(pd.to_datetime(values)), dtype=object)
+    return values.astype(object)
+
+
+def get_rectangles(starts, finishes, y0, y1):
+    ## outline of every event, rectangles separated by None
+    starts = get_x_values(starts)
+    finishes = get_x_values(finishes)
+    x = np.empty(starts.shape[0] * 6, dtype=object)
+    y = np.empty(starts.shape[0] * 6, dtype=object)
+    for n, (xn, yn) in enumerate(zip([starts, finishes, finishes, starts,
+                                        starts, None],
+                                     [y0, y0, y1, y1, y0, None])):
+        x[n::6] = xn
+        y[n::6] = yn
+    return list(x), list(y)
+
+
+def get_hover_points(starts, finishes, step):
+    ## positions along every event no more than step apart, from its start to
+    ## its finish, and the event each belongs to
+    starts = np.asarray(starts)
+    finishes = np.asarray(finishes)
+    steps = np.ceil(np.maximum((finishes - starts) / step, 0))
+    counts = steps.astype(np.int64) + 1
+    events = np.repeat(np.arange(starts.shape[0]), counts)
+    first = np.repeat(np.cumsum(counts) - counts, counts)
+    k = np.arange(events.shape[0]) - first
+    x = np.minimum(starts[events] + k * step, finishes[events])
+    return get_x_values(x), events
+
+
+def get_event_traces(records, colors, y0, y1, label_color=None,
+                        hover_step=10):
+    ## hover_step in minutes; times may be dates or minutes as numbers
+    import plotly.graph_objs as go
+    event_types = list(colors)
+    missing = sorted(set(records['Event_type'].dropna()) - set(colors))
+    if missing:
+        logger.warning('no color for event types %s, drawn in %s',
+                        missing, default_color)
+        event_types.extend(missing)
+
+    traces = []
+    for event_type in event_types:
+        color = colors.get(event_type, default_color)
+        events = records[records['Event_type'] == event_type]
+        if events.shape[0] == 0:
+            continue
+        starts = events['Start'].values
+        finishes = events['Finish'].values
+        x, y = get_rectangles(starts, finishes, y0, y1)
+        traces.append(go.Scatter(
+                x=x,
+                y=y,
+                mode='none',
+                fill='toself',
+                fillcolor=color,
+                hoverinfo='none',
+                showlegend=False,
+        ))
+        if starts.dtype.kind == 'M':
+            step = np.timedelta64(hover_step, 'm')
+        else:
+            step = hover_step
+        hover_x, hover_events = get_hover_points(starts, finishes, step)
+        details = events['Event_details'].fillna('').values
+        traces.append(go.Scatter(
+                x=list(hover_x),
+                y=[(y0 + y1) / 2.] * hover_events.shape[0],
+                mode='markers',
+                marker={'color' : color, 'opacity' : 0},
+                text=list(details[hover_events]),
+                hoverinfo='text',
+                showlegend=False,
+        ))
+        if label_color is not None:
+            traces.append(go.Scatter(
+                    x=list(get_x_values(starts)),
+                    y=[y1] * events.shape[0],
+                    mode='text',
+                    text=[event_type] * events.shape[0],
+                    textposition='top right',
+                    textfont={'size' : 10,
+                              'color' : label_color
+                              },
+                    hoverinfo='none',
+                    showlegend=False,
+            ))
+    return traces
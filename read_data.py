@@ -1,196 +1,489 @@
-from datetime import datetime, timedelta
-import pandas as pd
-import numpy as np
-import os
-from scipy.interpolate import interp1d, PchipInterpolator
-
-def expand_time(data):
-    t = data['Time'].values.astype('uint64')/1e9
-    g = data['Glucose (mmol/L)'].values
-
-    new_t = np.arange(t[0], t[-1]+1, 60)
-    #~ new_g = PchipInterpolator(t, g)(new_t)
-    new_g = interp1d(t, g)(new_t)
-
-    new_data = {'Time' : pd.to_datetime(pd.Series(new_t*1e9)),
-                'Glucose (mmol/L)' : new_g}
-    new_data = pd.DataFrame(new_data)
-    new_data['original_data_point'] = new_data['Time'].isin(data['Time'])
-    return new_data
-
-def insert(df, index, values):
-    df1 = df[:index]
-    df2 = df[index:]
-    values = {k:v for k,v in zip(df.columns.values, values)}
-    df1 = df1.append(values,ignore_index=True)
-    return pd.concat((df1, df2)).reset_index(drop=True)
-
-
-def add_sleep_info(data, records):
-    sleep_records = records[records['Event_type'] == 'Sleep']
-    i = j = 0
-    sleep_info = [False] * data.shape[0]
-    while i < data.shape[0] and j < sleep_records.shape[0]:
-        if data.iloc[i]['Time'] <= sleep_records.iloc[j]['Start']:
-            i += 1
-        elif data.iloc[i]['Time'] > sleep_records.iloc[j]['Start']:
-            sleep_info[i] = True
-            i += 1
-        if data.iloc[i-1]['Time'] > sleep_records.iloc[j]['Finish']:
-            j += 1
-
-    data['is_sleep'] = sleep_info
-    return data
-
-
-def add_postprandial_info(data, records, time_interval=120):
-    meal_records = records[records['Event_type'] == 'Meal']
-    i = j = 0
-    postprandial_info = [False] * data.shape[0]
-    while i < data.shape[0] and j < meal_records.shape[0]:
-        start = meal_records.iloc[j]['Start']
-        interval_finish = start + timedelta(seconds=60*time_interval)
-        if data.iloc[i]['Time'] <= start:
-            i += 1
-        elif data.iloc[i]['Time'] > start:
-            postprandial_info[i] = True
-            i += 1
-        if data.iloc[i-1]['Time'] > interval_finish:
-            j += 1
-
-    data['is_post_prandial'] = postprandial_info
-    return data
-
-
-def read_cgm_data(fname, start_date, end_date):
-    ## read and process glucose readings
-    cgm_raw_file = os.path.join('data', 'raw', 'libre_data.txt')
-    cgm_data = pd.read_csv(cgm_raw_file, sep='\t')
-    time_reader = lambda s: datetime.strptime(s,'%Y/%m/%d %H:%M')
-    cgm_data['Time'] = cgm_data['Time'].apply(time_reader)
-    cgm_data = cgm_data[(cgm_data['Time'] > start_date)
-                                & (cgm_data['Time'] <= end_date)]
-    return cgm_data
-
-def process_cgm_data(cgm_data, records):
-
-    cgm_data = cgm_data.sort_values('Time')
-    historic_gl = cgm_data['Historic Glucose (mmol/L)']
-    scan_gl = cgm_data['Scan Glucose (mmol/L)']
-    cgm_data['Glucose (mmol/L)'] = historic_gl.fillna(scan_gl)
-    cgm_data = cgm_data[['Time', 'Glucose (mmol/L)']]
-
-    time_gaps = np.where(cgm_data['Time'].diff() > timedelta(minutes=20))[0]
-    for n, tg in enumerate(time_gaps):
-        mid_time = cgm_data['Time'].iloc[tg+n-1] + timedelta(minutes=10)
-        cgm_data = insert(cgm_data, tg+n, values=[mid_time, np.NaN])
-
-    cgm_data = expand_time(cgm_data)
-    ## post process glucose data
-    cgm_data = add_sleep_info(cgm_data, records)
-    cgm_data = add_postprandial_info(cgm_data, records)
-    return cgm_data
-
-def read_praveen_records():
-    def time_reader(s):
-        t = datetime.strptime(s, "%d/%m/%y %H:%M")
-        return t
-
-    records = pd.read_csv(os.path.join('data', 'raw', 'records_praveen.csv'))
-    records['Start'] = records['Start'].apply(time_reader)
-    records['Finish'] = records['Finish'].apply(time_reader)
-    return records
-
-def read_cherwee_records():
-    def time_reader(s):
-        t = datetime.strptime(s, "%d/%m/%y %H:%M")
-        return t
-
-    records = pd.read_csv(os.path.join('data', 'raw', 'records_cherwee.csv'))
-    records['Start'] = records['Start'].apply(time_reader)
-    records['Finish'] = records['Finish'].apply(time_reader)
-    return records
-
-
-def read_angela_records():
-    def time_reader(s):
-        s = s.replace('Jul ', 'July ').replace('Aug ', 'August ')
-        t = datetime.strptime(s, '%d %B %H:%M %p')
-        t = t.replace(year=2018)
-        return t
-
-    records = pd.read_csv(os.path.join('data', 'raw', 'records_angela.csv'))
-    records['Start'] = records['Start'].apply(time_reader)
-    records['Finish'] = records['Finish'].apply(time_reader)
-    return records
-
-
-def read_yq_records():
-    def time_reader(s):
-        t = datetime.strptime(s, '%Y/%m/%d %H:%M')
-        return t
-
-    records = pd.read_csv(os.path.join('data', 'raw', 'records_yq.csv'))
-    records['Start'] = records['Start'].apply(time_reader)
-    records['Finish'] = (records['Start']
-                        + pd.to_timedelta(records['duration'], unit='m'))
-    records['Event'] = records['Event'].str.capitalize()
-    return records
-
-
-def process_records(records):
-    events = records['Event'].str.split(':', expand=True)
-    events['Event_type'] = events.pop(0).str.strip()
-    events['Event_details'] = events.pop(1).str.strip()
-    times = records[['Start', 'Finish']]
-    records = pd.concat((times, events), axis=1)
-    return records
-
-def mkdir(path):
-    if not os.path.exists(path):
-        os.makedirs(path)
-
-
-def get_data(user):
-    records_file = os.path.join('data', 'pkl', '{}_records.pkl'.format(user))
-    cgm_file = os.path.join('data', 'pkl', '{}_cgm.pkl'.format(user))
-
-    if os.path.exists(records_file):
-        records = pd.read_pickle(records_file)
-    else:
-        records = config[user]['records_reader']()
-        records = process_records(records)
-        mkdir(os.path.join('data', 'pkl'))
-        records.to_pickle(records_file)
-
-    if os.path.exists(cgm_file):
-        cgm_data = pd.read_pickle(cgm_file)
-    else:
-        start_date = config[user]['start_date']
-        end_date = config[user]['end_date']
-        cgm_data = read_cgm_data('libre_data.txt', start_date, end_date)
-        cgm_data = process_cgm_data(cgm_data, records)
-        mkdir(os.path.join('data', 'pkl'))
-        cgm_data.to_pickle(cgm_file)
-
-    return records, cgm_data
-
-
-config = {
-          'Praveen' :   {'start_date' : datetime(2018, 6, 5),
-                         'end_date' : datetime(2018, 6, 18),
-                         'records_reader' : read_praveen_records
-                        },
-          'Angela'  :   {'start_date' : datetime(2018, 7, 23),
-                         'end_date' : datetime(2018, 8, 6),
-                         'records_reader' : read_angela_records
-                        },
-           'YQ'     :    {'start_date' : datetime(2018, 5, 17),
-                         'end_date' : datetime(2018, 5, 31),
-                         'records_reader' : read_yq_records
-                        },
-           'Cher Wee' : {'start_date' : datetime(2018, 6, 26),
-                         'end_date' : datetime(2018, 7, 10),
-                         'records_reader' : read_cherwee_records
-                        }
-}
+from datetime import datetime, timedelta
+import pandas as pd
+import numpy as np
+import os
+import re
+import glob
+import time
+import shutil
+import intervals
+import column_store
+from intervals import label_events, as_datetime64
+from instrument import stage
+from compact import compact_cgm_data
+from cache import LRUCache, frame_view, get_cache_key, file_digest
+from column_store import (write_columns, open_columns, read_columns,
+                            read_index, write_index, append_columns,
+                            replace_columns, get_tmp_path, move_store)
+
+@stage
+def expand_time(data, segments=None):
+    ## seconds from the first reading, small enough that float64 holds them
+    ## exactly, and grid times built as whole minutes from that reading
+    times = as_datetime64(data['Time'].values)
+    t = (times - times[0]) / np.timedelta64(1, 's')
+    g = data['Glucose (mmol/L)'].values
+
+    new_t = np.arange(0, t[-1]+1, 60)
+    ## linear interpolation, as scipy's interp1d gave before without the
+    ## cost of importing scipy
+    #~ new_g = PchipInterpolator(t, g)(new_t)
+    new_g = np.interp(new_t, t, g)
+
+    minutes = np.arange(new_t.shape[0]).astype('timedelta64[m]')
+    new_data = {'Time' : times[0] + minutes.astype('timedelta64[ns]'),
+                'Glucose (mmol/L)' : new_g}
+    new_data = pd.DataFrame(new_data, columns=['Time', 'Glucose (mmol/L)'])
+    new_data['original_data_point'] = new_data['Time'].isin(data['Time'])
+    if segments is not None:
+        new_data['segment'] = get_segment_ids(new_data['Time'].values,
+                                                segments)
+    return new_data
+
+
+@stage
+def find_segments(times, max_gap=timedelta(minutes=20)):
+    ## runs of readings with no gap longer than max_gap between them
+    times = as_datetime64(times)
+    breaks = np.where(np.diff(times) > np.timedelta64(max_gap))[0] + 1
+    first = np.concatenate(([0], breaks))
+    last = np.concatenate((breaks, [len(times)])) - 1
+    segments = pd.DataFrame({'Start' : times[first],
+                             'End' : times[last],
+                             'Readings' : last - first + 1},
+                            columns=['Start', 'End', 'Readings'])
+    segments['Length'] = segments['End'] - segments['Start']
+    return segments
+
+
+def get_segment_ids(times, segments):
+    ## segment number of every time stamp, -1 for times inside a gap
+    times = as_datetime64(times)
+    ids = np.searchsorted(as_datetime64(segments['Start'].values),
+                            times, side='right') - 1
+    ends = as_datetime64(segments['End'].values)
+    inside = (ids >= 0) & (times <= ends[np.maximum(ids, 0)])
+    return np.where(inside, ids, -1)
+
+
+def get_segments(cgm_data):
+    grid = cgm_data[cgm_data['segment'] >= 0]
+    segments = grid.groupby('segment')['Time'].agg(['min', 'max'])
+    segments.columns = ['Start', 'End']
+    segments['Length'] = segments['End'] - segments['Start']
+    return segments
+
+
+@stage
+def insert_gap_breaks(cgm_data, segments, offset=timedelta(minutes=10)):
+    ## one NaN reading shortly after the end of every segment but the last,
+    ## so interpolation does not bridge the gaps
+    times = as_datetime64(cgm_data['Time'].values)
+    glucose = cgm_data['Glucose (mmol/L)'].values
+    gaps = np.cumsum(segments['Readings'].values[:-1])
+    positions = gaps + np.arange(len(gaps))
+
+    is_break = np.zeros(len(times) + len(gaps), dtype=bool)
+    is_break[positions] = True
+    new_times = np.empty(is_break.shape[0], dtype=times.dtype)
+    new_times[is_break] = times[gaps - 1] + np.timedelta64(offset)
+    new_times[~is_break] = times
+    new_glucose = np.full(is_break.shape[0], np.nan)
+    new_glucose[~is_break] = glucose
+
+    return pd.DataFrame({'Time' : new_times,
+                         'Glucose (mmol/L)' : new_glucose},
+                        columns=['Time', 'Glucose (mmol/L)'])
+
+
+def add_event_info(data, records, event_type, column, time_interval=None):
+    data[column] = label_events(data['Time'].values, records, event_type,
+                                    time_interval=time_interval)
+    return data
+
+
+def add_sleep_info(data, records):
+    return add_event_info(data, records, 'Sleep', 'is_sleep')
+
+
+def add_postprandial_info(data, records, time_interval=120):
+    return add_event_info(data, records, 'Meal', 'is_post_prandial',
+                            time_interval=time_interval)
+
+
+def add_activity_info(data, records):
+    return add_event_info(data, records, 'Activity', 'is_activity')
+
+
+def parse_times(values, time_format, year=None, replace=None):
+    ## each distinct string is parsed once, in one vectorized call
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Series(uniques).astype(str)
+    for old, new in sorted((replace or {}).items()):
+        uniques = uniques.str.replace(old, new, regex=False)
+    if year is not None:
+        uniques = '{} '.format(year) + uniques
+        time_format = '%Y ' + time_format
+    parsed = pd.to_datetime(uniques, format=time_format).values
+    parsed = np.append(as_datetime64(parsed), np.datetime64('NaT', 'ns'))
+    return pd.Series(parsed[codes], index=getattr(values, 'index', None))
+
+
+@stage
+def read_times(values, source):
+    ## a stage of its own, so parsing is timed apart from reading the files
+    return parse_times(values, source['time_format'],
+                        year=source.get('year'),
+                        replace=source.get('replace'))
+
+
+def get_libre_windows():
+    ## [start_date, end_date] of every configured user, the only parts of
+    ## the export that read_cgm_data is asked for
+    starts = [config[user]['start_date'] for user in sorted(config)]
+    finishes = [config[user]['end_date'] or no_end
+                for user in sorted(config)]
+    return intervals.IntervalSet(starts, finishes)
+
+
+@stage
+def load_libre_data(fname, windows=None, chunksize=100000):
+    ## the export is parsed once per file version and set of user windows, a
+    ## chunk at a time, keeping from each chunk only the rows inside the
+    ## windows and only the columns process_cgm_data needs. Memory holds one
+    ## raw chunk plus the rows the users need, whatever the export's size.
+    if windows is None:
+        windows = get_libre_windows()
+    stat = os.stat(fname)
+    version = (stat.st_mtime, stat.st_size, windows.starts.tolist(),
+               windows.finishes.tolist())
+    path = os.path.abspath(fname)
+    if path in libre_store and libre_store[path][0] == version:
+        return libre_store[path][1]
+
+    columns = ['Time', 'Historic Glucose (mmol/L)', 'Scan Glucose (mmol/L)']
+    dtypes = {c : float for c in columns[1:]}
+    chunks = []
+    for chunk in pd.read_csv(fname, sep=libre_source['sep'], usecols=columns,
+                                dtype=dtypes, chunksize=chunksize):
+        chunk['Time'] = read_times(chunk['Time'], libre_source)
+        chunks.append(chunk[windows.contains(chunk['Time'].values)])
+    cgm_data = pd.concat(chunks, ignore_index=True)
+    del chunks
+    ## exports come in time order, sorting is only needed when one did not
+    if not cgm_data['Time'].is_monotonic_increasing:
+        cgm_data = cgm_data.sort_values('Time', kind='mergesort')
+        cgm_data = cgm_data.reset_index(drop=True)
+    cgm_data = cgm_data[columns]
+
+    libre_store[path] = (version, cgm_data)
+    return cgm_data
+
+
+@stage
+def read_cgm_data(fname, start_date, end_date):
+    ## read glucose readings in (start_date, end_date]
+    cgm_raw_file = os.path.join('data', 'raw', fname)
+    cgm_data = load_libre_data(cgm_raw_file)
+    times = as_datetime64(cgm_data['Time'].values)
+    first = np.searchsorted(times, np.datetime64(start_date), side='right')
+    last = len(times)
+    if end_date is not None:
+        last = np.searchsorted(times, np.datetime64(end_date), side='right')
+    return cgm_data.iloc[first:last].copy()
+
+@stage
+def process_cgm_data(cgm_data, records, time_interval=120, max_gap=20):
+
+    cgm_data = cgm_data.sort_values('Time')
+    historic_gl = cgm_data['Historic Glucose (mmol/L)']
+    scan_gl = cgm_data['Scan Glucose (mmol/L)']
+    cgm_data['Glucose (mmol/L)'] = historic_gl.fillna(scan_gl)
+    cgm_data = cgm_data[['Time', 'Glucose (mmol/L)']]
+
+    segments = find_segments(cgm_data['Time'].values,
+                                max_gap=timedelta(minutes=max_gap))
+    cgm_data = insert_gap_breaks(cgm_data, segments)
+
+    cgm_data = expand_time(cgm_data, segments=segments)
+    ## post process glucose data
+    cgm_data = add_labels(cgm_data, records, time_interval=time_interval)
+    return cgm_data
+
+
+@stage
+def add_labels(cgm_data, records, time_interval=120):
+    cgm_data = add_sleep_info(cgm_data, records)
+    cgm_data = add_postprandial_info(cgm_data, records,
+                                        time_interval=time_interval)
+    cgm_data = add_activity_info(cgm_data, records)
+    return cgm_data
+
+
+@stage
+def append_cgm_data(path, records, end_date, time_interval=120, max_gap=20):
+    ## process only the readings newer than the stored tail. The last stored
+    ## reading is processed again as the first point of the new span so gap
+    ## breaks and interpolation continue exactly across the boundary.
+    ## Stored history is assumed to be unchanged by the new export.
+    index, columns = open_columns(path)
+    tail = pd.Timestamp(columns['Time'][-1])
+    last_segment = columns['segment'][-1]
+
+    cgm_data = read_cgm_data(libre_source['file'],
+                                tail - timedelta(microseconds=1), end_date)
+    if not (cgm_data['Time'] > tail).any():
+        return 0
+    cgm_data = process_cgm_data(cgm_data, records,
+                                time_interval=time_interval, max_gap=max_gap)
+    cgm_data = cgm_data[cgm_data['Time'] > tail].copy()
+    ## a label depends on the grid times before it, as in the old scan, so
+    ## the new rows are labelled along with the stored ones
+    times = pd.DataFrame({'Time' : np.concatenate((np.array(columns['Time']),
+                                                   cgm_data['Time'].values))})
+    labels = add_labels(times, records, time_interval=time_interval)
+    for column in labels.columns.drop('Time'):
+        cgm_data[column] = labels[column].values[-cgm_data.shape[0]:]
+    segment = cgm_data['segment'].values
+    cgm_data['segment'] = np.where(segment >= 0, segment + last_segment, -1)
+    append_columns(path, cgm_data)
+    return cgm_data.shape[0]
+
+
+@stage
+def relabel_cgm_data(path, records, time_interval=120):
+    ## labels over the whole stored grid, for when the records changed
+    index, columns = open_columns(path)
+    cgm_data = pd.DataFrame({'Time' : np.array(columns['Time'])})
+    cgm_data = add_labels(cgm_data, records, time_interval=time_interval)
+    replace_columns(path, cgm_data.drop('Time', axis=1))
+
+
+@stage
+def read_records(source):
+    fname = os.path.join('data', 'raw', source['file'])
+    records = pd.read_csv(fname)
+    records['Start'] = read_times(records['Start'], source)
+    if 'duration' in source:
+        ## durations in minutes instead of a finish time
+        records['Finish'] = (records['Start']
+                    + pd.to_timedelta(records[source['duration']], unit='m'))
+    else:
+        records['Finish'] = read_times(records['Finish'], source)
+    if source.get('capitalize_events'):
+        records['Event'] = records['Event'].str.capitalize()
+    return records
+
+
+@stage
+def process_records(records):
+    events = records['Event'].str.split(':', expand=True)
+    events['Event_type'] = events.pop(0).str.strip()
+    events['Event_details'] = events.pop(1).str.strip()
+    times = records[['Start', 'Finish']]
+    records = pd.concat((times, events), axis=1)
+    return records
+
+def get_data_keys(user, time_interval=120, max_gap=20):
+    ## the base key changes with the user's config, the processing parameters
+    ## and the processing code, the full key also with the raw files
+    params = {'user' : user,
+              'config' : config[user],
+              'libre_source' : libre_source,
+              'time_interval' : time_interval,
+              'max_gap' : max_gap}
+    base_key = get_cache_key([__file__, intervals.__file__,
+                              column_store.__file__], params)
+    files = [os.path.join('data', 'raw', libre_source['file']),
+             os.path.join('data', 'raw', config[user]['records']['file'])]
+    return base_key, get_cache_key(files, base_key)
+
+
+def get_store_paths(user):
+    ## (path, key) of the user's stores in data/pkl, finished or temporary.
+    ## Names are matched exactly, so the stores of a user 'A_1' are not taken
+    ## for stores of 'A'.
+    name = re.compile(r'^{}_([0-9a-f]+)_(records|cgm)(\.\d+\.tmp)?$'.format(
+                                                            re.escape(user)))
+    pattern = '{}_*'.format(glob.escape(user))
+    for path in glob.glob(os.path.join('data', 'pkl', pattern)):
+        match = name.match(os.path.basename(path))
+        if match:
+            yield path, match.group(1)
+
+
+def remove_stale_files(user, key, tmp_age=3600):
+    ## stores of other keys, and temporary stores old enough that the run
+    ## writing them must have died
+    for path, path_key in get_store_paths(user):
+        if path.endswith('.tmp'):
+            if time.time() - os.path.getmtime(path) < tmp_age:
+                continue
+        elif path_key == key:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+
+
+def find_previous_store(user, base_key):
+    ## most recent cgm store built with the same config, parameters and code
+    paths = [path for path, path_key in get_store_paths(user)
+                if path.endswith('_cgm')
+                and os.path.exists(os.path.join(path, 'index.json'))
+                and read_index(path)['meta'].get('base_key') == base_key]
+    if not paths:
+        return None
+    return max(paths, key=os.path.getmtime)
+
+
+@stage
+def open_data(user, time_interval=120, max_gap=20, incremental=False):
+    ## memory mapped column stores of the user's records and cgm data,
+    ## built on first use. With incremental=True a store from an older
+    ## export is extended with the new readings instead of being rebuilt.
+    base_key, key = get_data_keys(user, time_interval=time_interval,
+                                    max_gap=max_gap)
+    if (user, key) in store_cache:
+        return key, store_cache[(user, key)]
+
+    records_file = os.path.join('data', 'raw', config[user]['records']['file'])
+    records_path = os.path.join('data', 'pkl',
+                                    '{}_{}_records'.format(user, key))
+    cgm_path = os.path.join('data', 'pkl', '{}_{}_cgm'.format(user, key))
+
+    if not os.path.exists(records_path):
+        records = read_records(config[user]['records'])
+        records = process_records(records)
+        write_columns(records_path, records)
+    records_store = open_columns(records_path)
+
+    if not os.path.exists(cgm_path):
+        start_date = config[user]['start_date']
+        end_date = config[user]['end_date']
+        records = read_columns(records_store)
+        meta = {'base_key' : base_key,
+                'records_digest' : file_digest(records_file)}
+        previous = None
+        if incremental:
+            previous = find_previous_store(user, base_key)
+        if previous is not None:
+            ## extended under a temporary name, a concurrent run may have
+            ## taken the previous store already
+            tmp_path = get_tmp_path(cgm_path)
+            try:
+                old_meta = read_index(previous)['meta']
+                os.rename(previous, tmp_path)
+            except OSError:
+                previous = None
+        if previous is not None:
+            try:
+                append_cgm_data(tmp_path, records, end_date,
+                                time_interval=time_interval, max_gap=max_gap)
+                if old_meta['records_digest'] != meta['records_digest']:
+                    relabel_cgm_data(tmp_path, records,
+                                        time_interval=time_interval)
+                index = read_index(tmp_path)
+                index['meta'] = meta
+                write_index(tmp_path, index)
+            except Exception:
+                shutil.rmtree(tmp_path)
+                raise
+            move_store(tmp_path, cgm_path)
+        else:
+            cgm_data = read_cgm_data(libre_source['file'], start_date,
+                                        end_date)
+            cgm_data = process_cgm_data(cgm_data, records,
+                                        time_interval=time_interval,
+                                        max_gap=max_gap)
+            write_columns(cgm_path, cgm_data, meta=meta)
+        remove_stale_files(user, key)
+    cgm_store = open_columns(cgm_path)
+
+    store_cache[(user, key)] = (records_store, cgm_store)
+    return key, store_cache[(user, key)]
+
+
+@stage
+def get_data(user, time_interval=120, max_gap=20, incremental=False,
+                compact=False, copy=False):
+    ## with compact=True the cgm data comes as compact.compact_cgm_data
+    ## builds it, straight from the memory mapped columns. The frames share
+    ## the cached arrays, read only, see cache.frame_view; copy=True gives
+    ## copies to modify in place.
+    key, stores = open_data(user, time_interval=time_interval,
+                                max_gap=max_gap, incremental=incremental)
+    if (user, key, compact) not in data_cache:
+        records_store, cgm_store = stores
+        if compact:
+            cgm_data = compact_cgm_data(cgm_store[1])
+        else:
+            cgm_data = read_columns(cgm_store)
+        data_cache[(user, key, compact)] = (read_columns(records_store),
+                                            cgm_data)
+    records, cgm_data = data_cache[(user, key, compact)]
+    return frame_view(records, copy=copy), frame_view(cgm_data, copy=copy)
+
+
+def get_records(user):
+    key, (records_store, cgm_store) = open_data(user)
+    return read_columns(records_store)
+
+
+def get_cgm_window(user, start, end, time_interval=120, max_gap=20):
+    ## cgm data with start <= Time <= end, read straight from the store
+    key, (records_store, cgm_store) = open_data(user,
+                                                time_interval=time_interval,
+                                                max_gap=max_gap)
+    return read_columns(cgm_store, start=start, end=end)
+
+
+## raw file formats, see read_times() and read_records()
+libre_source = {'file' : 'libre_data.txt',
+                'sep' : '\t',
+                'time_format' : '%Y/%m/%d %H:%M'
+               }
+
+## the finish of a window without an end_date, see get_libre_windows()
+no_end = np.datetime64(np.iinfo(np.int64).max, 'ns')
+
+## parsed Libre exports by absolute path, see load_libre_data()
+libre_store = {}
+
+## column stores and processed (records, cgm_data) by (user, data key),
+## see open_data() and get_data()
+store_cache = LRUCache(maxsize=32)
+data_cache = LRUCache(maxsize=8)
+
+config = {
+          'Praveen' :   {'start_date' : datetime(2018, 6, 5),
+                         'end_date' : datetime(2018, 6, 18),
+                         'records' : {'file' : 'records_praveen.csv',
+                                      'time_format' : '%d/%m/%y %H:%M'
+                                     }
+                        },
+          'Angela'  :   {'start_date' : datetime(2018, 7, 23),
+                         'end_date' : datetime(2018, 8, 6),
+                         'records' : {'file' : 'records_angela.csv',
+                                      'time_format' : '%d %B %H:%M %p',
+                                      'replace' : {'Jul ' : 'July ',
+                                                   'Aug ' : 'August '},
+                                      'year' : 2018
+                                     }
+                        },
+           'YQ'     :    {'start_date' : datetime(2018, 5, 17),
+                         'end_date' : datetime(2018, 5, 31),
+                         'records' : {'file' : 'records_yq.csv',
+                                      'time_format' : '%Y/%m/%d %H:%M',
+                                      'duration' : 'duration',
+                                      'capitalize_events' : True
+                                     }
+                        },
+           'Cher Wee' : {'start_date' : datetime(2018, 6, 26),
+                         'end_date' : datetime(2018, 7, 10),
+                         'records' : {'file' : 'records_cherwee.csv',
+                                      'time_format' : '%d/%m/%y %H:%M'
+                                     }
+                        }
+}
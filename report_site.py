@@ -0,0 +1,253 @@
+import os
+import re
+import glob
+import json
+import numpy as np
+import pandas as pd
+from importlib.metadata import version
+from cache import get_cache_key
+
+## Reports are written as small html pages sharing one plotly.js file. Next
+## to every page a key of its inputs is kept in .reports/, so a report whose
+## inputs and code did not change is skipped on the next run. plotly is
+## imported only when a page is written, a run with nothing to write never
+## pays for it.
+
+plotly_version = version('plotly')
+code_files = sorted(glob.glob(os.path.join(os.path.dirname(
+                                        os.path.abspath(__file__)), '*.py')))
+
+page_template = """<html>
+    <head>
+        <meta charset="utf-8" />
+        <title>{title}</title>
+        <script src="{plotlyjs}"></script>
+    </head>
+    <body>
+        {body}
+    </body>
+</html>
+"""
+
+
+index_template = """<html>
+    <head>
+        <meta charset="utf-8" />
+        <title>Reports</title>
+    </head>
+    <body>
+        <ul>
+            {items}
+        </ul>
+    </body>
+</html>
+"""
+
+
+def get_plotlyjs_name():
+    return 'plotly-{}.min.js'.format(plotly_version)
+
+
+def write_plotlyjs(root='html'):
+    fname = os.path.join(root, get_plotlyjs_name())
+    if not os.path.exists(fname):
+        from plotly.offline import get_plotlyjs
+        tmp_fname = '{}.{}.tmp'.format(fname, os.getpid())
+        with open(tmp_fname, 'w') as fd:
+            fd.write(get_plotlyjs())
+        os.replace(tmp_fname, fname)
+
+
+def get_report_key(inputs):
+    ## inputs should name the data (e.g. data keys from read_data) and the
+    ## parameters of the report; the code of this package is always included
+    params = {'inputs' : inputs, 'plotly' : plotly_version}
+    return get_cache_key(code_files, params)
+
+
+def get_key_file(fname):
+    root, name = os.path.split(fname)
+    return os.path.join(root, '.reports', name + '.json')
+
+
+def is_current(fname, key):
+    key_file = get_key_file(fname)
+    if not (os.path.exists(fname) and os.path.exists(key_file)):
+        return False
+    with open(key_file) as fd:
+        return json.load(fd)['key'] == key
+
+
+## Figures are written with no more data than is shown. y values read only
+## through hover labels (hoverinfo 'y') are rounded to the hoverformat of
+## their axis, evenly spaced x values are written as a start and a step
+## (x0 and dx, in ms for dates) and other times as strings without unused
+## seconds. Frames carry only the traces they change, named by 'traces'.
+
+time_units = [('m', 60 * 10**9), ('s', 10**9), ('ms', 10**6)]
+
+
+def get_precision(layout, trace):
+    axis = 'yaxis' + trace.get('yaxis', 'y')[1:]
+    hoverformat = layout.get(axis, {}).get('hoverformat', '')
+    match = re.match(r'^\.(\d+)f$', hoverformat)
+    return int(match.group(1)) if match else None
+
+
+def get_times(values):
+    ## datetime64 values of an array of dates, None otherwise
+    values = np.asarray(values)
+    if (values.dtype == object and values.shape[0] > 0
+            and all(hasattr(v, 'year') for v in values)):
+        values = pd.to_datetime(values).values
+    if values.dtype.kind == 'M':
+        return values.astype('datetime64[ns]')
+    return None
+
+
+def format_times(times):
+    ## the shortest unit that shows every time exactly, NaT stays 'NaT'
+    ns = times[~np.isnat(times)].astype(np.int64)
+    unit = next((unit for unit, size in time_units
+                 if (ns % size == 0).all()), 'us')
+    return np.datetime_as_string(times, unit=unit)
+
+
+def get_values(values, precision=None):
+    ## plain list for json, with missing values as None
+    values = np.asarray(values)
+    if values.dtype.kind not in 'fiub':
+        return compact_objects(values)
+    if values.dtype.kind == 'f':
+        values = values.astype(float)
+        if precision is not None:
+            values = np.round(values, precision)
+        return [None if v != v else v for v in values.tolist()]
+    return values.tolist()
+
+
+def compact_objects(values):
+    ## dates among None (the outlines of records) become strings
+    present = np.array([v is not None for v in values], dtype=bool)
+    times = get_times(values[present])
+    if times is None:
+        return list(values)
+    values = np.array(values, dtype=object)
+    values[present] = format_times(times)
+    return values.tolist()
+
+
+def compact_axis(trace, axis):
+    ## x0 and dx in place of evenly spaced values
+    values = np.asarray(trace[axis])
+    if values.shape[0] < 3 or values.ndim != 1:
+        return
+    times = get_times(values)
+    if times is not None:
+        if np.isnat(times).any():
+            return
+        steps = np.diff(times.astype(np.int64))
+        if (steps[0] > 0 and steps[0] % 10**6 == 0
+                and (steps == steps[0]).all()):
+            trace[axis + '0'] = str(format_times(times[:1])[0])
+            trace['d' + axis] = int(steps[0] // 10**6)
+            del trace[axis]
+    elif values.dtype.kind in 'fiu' and not np.isnan(values).any():
+        steps = np.diff(values)
+        if steps[0] != 0 and (steps == steps[0]).all():
+            trace[axis + '0'] = values[0].item()
+            trace['d' + axis] = steps[0].item()
+            del trace[axis]
+
+
+def compact_trace(trace, precision=None):
+    trace = dict(trace)
+    if 'x' in trace and trace['x'] is not None:
+        compact_axis(trace, 'x')
+    for axis in ['x', 'y']:
+        if trace.get(axis) is not None and not isinstance(trace[axis], str):
+            trace[axis] = get_values(trace[axis],
+                                     precision if axis == 'y' else None)
+    return trace
+
+
+def to_dict(item):
+    if hasattr(item, 'to_plotly_json'):
+        return item.to_plotly_json()
+    return dict(item)
+
+
+def compact_figure(fig):
+    ## fig is a go.Figure or a dict of data, layout and frames
+    from plotly.utils import PlotlyJSONEncoder
+    fig = to_dict(fig)
+    layout = json.loads(json.dumps(to_dict(fig.get('layout', {})),
+                                   cls=PlotlyJSONEncoder))
+    data = [to_dict(trace) for trace in fig.get('data', [])]
+    precisions = [get_precision(layout, trace)
+                    if trace.get('hoverinfo') == 'y' else None
+                  for trace in data]
+
+    frames = []
+    for frame in fig.get('frames') or []:
+        frame = to_dict(frame)
+        traces = frame.get('traces', range(len(frame.get('data', []))))
+        frame['data'] = [compact_trace(to_dict(trace), precisions[n])
+                         for n, trace in zip(traces, frame.get('data', []))]
+        frames.append(frame)
+
+    compact = {'data' : [compact_trace(trace, precision)
+                         for trace, precision in zip(data, precisions)],
+               'layout' : layout}
+    if frames:
+        compact['frames'] = frames
+    return compact
+
+
+def get_div(fig):
+    import plotly.io as pio
+    return pio.to_html(compact_figure(fig), config={'showLink' : False},
+                        auto_play=False, include_plotlyjs=False,
+                        full_html=False, validate=False)
+
+
+def write_report(fname, div, key, title=None, index=True):
+    ## with index=False the index page is left to the caller, as a batch of
+    ## workers writing it each from its own listing can drop finished pages
+    root = os.path.dirname(fname)
+    if not os.path.exists(os.path.join(root, '.reports')):
+        os.makedirs(os.path.join(root, '.reports'))
+    write_plotlyjs(root)
+
+    title = title or os.path.splitext(os.path.basename(fname))[0]
+    tmp_fname = '{}.{}.tmp'.format(fname, os.getpid())
+    with open(tmp_fname, 'w') as fd:
+        fd.write(page_template.format(title=title, body=div,
+                                        plotlyjs=get_plotlyjs_name()))
+    os.replace(tmp_fname, fname)
+
+    key_file = get_key_file(fname)
+    tmp_fname = '{}.{}.tmp'.format(key_file, os.getpid())
+    with open(tmp_fname, 'w') as fd:
+        json.dump({'key' : key, 'title' : title}, fd)
+    os.replace(tmp_fname, key_file)
+    if index:
+        write_index(root)
+
+
+def write_index(root='html'):
+    items = []
+    for key_file in sorted(glob.glob(os.path.join(root, '.reports',
+                                                    '*.json'))):
+        name = os.path.basename(key_file)[:-len('.json')]
+        if not os.path.exists(os.path.join(root, name)):
+            continue
+        with open(key_file) as fd:
+            title = json.load(fd)['title']
+        items.append('<li><a href="{0}">{1}</a></li>'.format(name, title))
+
+    fname = os.path.join(root, 'index.html')
+    tmp_fname = '{}.{}.tmp'.format(fname, os.getpid())
+    with open(tmp_fname, 'w') as fd:
+        fd.write(index_template.format(items='\n            '.join(items)))
+    os.replace(tmp_fname, fname)
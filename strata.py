@@ -0,0 +1,161 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from intervals import as_datetime64, IntervalSet
+from compact import get_column
+from time_in_range import get_glucose_ranges, range_thresholds
+
+## Time in range and glucose distributions for many strata of the minute
+## grid at once. A factor turns the grid into integer codes with a label
+## per code (sleep state, weekday or weekend, hour of day, ...); strata are
+## all combinations of the chosen factors, and every statistic is one
+## bincount or one sort over the combined codes. The grid may be a frame
+## from read_data.get_data or a compact one from compact.compact_cgm_data.
+
+hour = np.timedelta64(1, 'h')
+
+
+def get_weekdays(cgm_data):
+    ## Monday is 0, 1970-01-01 was a Thursday
+    days = as_datetime64(get_column(cgm_data, 'Time')).astype(
+                                                            'datetime64[D]')
+    return (days.astype(np.int64) + 3) % 7
+
+
+def get_flag_factor(column, labels):
+    def get_codes(cgm_data):
+        return get_column(cgm_data, column).astype(np.int64), labels
+    return get_codes
+
+
+def get_day_type(cgm_data):
+    return (get_weekdays(cgm_data) >= 5).astype(np.int64), ['weekday',
+                                                             'weekend']
+
+
+def get_weekday(cgm_data):
+    return get_weekdays(cgm_data), ['Mon', 'Tue', 'Wed', 'Thu', 'Fri',
+                                    'Sat', 'Sun']
+
+
+def get_hour(cgm_data):
+    times = as_datetime64(get_column(cgm_data, 'Time'))
+    hours = (times - times.astype('datetime64[D]')) // hour
+    return hours.astype(np.int64), ['{:02d}:00'.format(h) for h in range(24)]
+
+
+factors = OrderedDict([
+    ('sleep'         , get_flag_factor('is_sleep', ['awake', 'sleep'])),
+    ('post_prandial' , get_flag_factor('is_post_prandial',
+                                       ['baseline', 'post prandial'])),
+    ('activity'      , get_flag_factor('is_activity', ['rest', 'activity'])),
+    ('day_type'      , get_day_type),
+    ('weekday'       , get_weekday),
+    ('hour'          , get_hour),
+])
+
+
+def get_date_mask(times, exclude):
+    ## False on excluded days; exclude holds dates (whole days) and
+    ## (start, finish) pairs
+    times = as_datetime64(times)
+    days = [np.datetime64(d, 'D') for d in exclude
+                if not isinstance(d, (tuple, list))]
+    ranges = [d for d in exclude if isinstance(d, (tuple, list))]
+    mask = ~np.isin(times.astype('datetime64[D]'), np.array(days,
+                                                    dtype='datetime64[D]'))
+    if ranges:
+        starts, finishes = zip(*ranges)
+        mask &= ~IntervalSet(starts, finishes).contains(times)
+    return mask
+
+
+def get_strata_codes(cgm_data, by):
+    ## one code per grid point over all combinations of the factors in by,
+    ## which are names in factors or (name, function) pairs
+    codes = np.zeros(cgm_data.shape[0], dtype=np.int64)
+    names = []
+    labels = []
+    for factor in by:
+        if isinstance(factor, tuple):
+            name, get_codes = factor
+        else:
+            name, get_codes = factor, factors[factor]
+        factor_codes, factor_labels = get_codes(cgm_data)
+        codes = codes * len(factor_labels) + factor_codes
+        names.append(name)
+        labels.append(factor_labels)
+    return codes, names, labels
+
+
+def get_quantiles(values, groups, counts, quantiles):
+    ## linear interpolation between order statistics within each group,
+    ## as np.percentile does
+    order = np.lexsort((values, groups))
+    values = values[order]
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    result = np.full((counts.shape[0], len(quantiles)), np.nan)
+    some = counts > 0
+    for n, q in enumerate(quantiles):
+        position = starts[some] + q * (counts[some] - 1)
+        low = np.floor(position).astype(np.int64)
+        high = np.ceil(position).astype(np.int64)
+        result[some, n] = (values[low]
+                            + (values[high] - values[low]) * (position - low))
+    return result
+
+
+def stratify(cgm_data, by, mask=None, thresholds=range_thresholds['default'],
+                original_only=False):
+    ## one row per stratum with the minutes and share of time in each
+    ## glucose range, and the count, mean, SD and quartiles of glucose.
+    ## With original_only the distribution uses only the readings, as the
+    ## box plots do; time in range always uses the whole grid.
+    codes, names, labels = get_strata_codes(cgm_data, by)
+    n_strata = int(np.prod([len(l) for l in labels]))
+    glucose = get_column(cgm_data, 'Glucose (mmol/L)').astype(float)
+    ranges = get_glucose_ranges(glucose, thresholds)
+    range_codes = np.asarray(ranges.codes)
+    n_ranges = len(ranges.categories)
+
+    use = range_codes >= 0
+    if mask is not None:
+        use &= np.asarray(mask, dtype=bool)
+    minutes = np.bincount(codes[use] * n_ranges + range_codes[use],
+                          minlength=n_strata * n_ranges)
+    minutes = minutes.reshape(n_strata, n_ranges)
+    share = 100. * minutes / np.maximum(minutes.sum(axis=1), 1)[:, None]
+
+    if original_only:
+        use &= get_column(cgm_data, 'original_data_point')
+    values = glucose[use]
+    groups = codes[use]
+    counts = np.bincount(groups, minlength=n_strata)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.bincount(groups, values, minlength=n_strata) / counts
+        squares = np.bincount(groups, (values - mean[groups]) ** 2,
+                              minlength=n_strata)
+        sd = np.sqrt(squares / (counts - 1))
+    sd[counts < 2] = np.nan
+    quartiles = get_quantiles(values, groups, counts, [0, 0.25, 0.5, 0.75, 1])
+
+    columns = ([('Time (minutes)', c) for c in ranges.categories]
+               + [('Time (%)', c) for c in ranges.categories]
+               + [('Glucose (mmol/L)', c) for c in
+                  ['count', 'mean', 'sd', 'min', '25%', '50%', '75%', 'max']])
+    data = np.hstack((minutes, share, counts[:, None], mean[:, None],
+                      sd[:, None], quartiles))
+    table = pd.DataFrame(data, columns=pd.MultiIndex.from_tuples(columns),
+                         index=pd.MultiIndex.from_product(labels, names=names))
+    table['Time (minutes)'] = table['Time (minutes)'].astype(int)
+    table[('Glucose (mmol/L)', 'count')] = counts
+    return table
+
+
+def stratify_users(users_data, by, masks=None, **options):
+    ## users_data maps a user to its cgm data, masks a user to a mask
+    tables = OrderedDict()
+    for user, cgm_data in users_data.items():
+        mask = None if masks is None else masks.get(user)
+        tables[user] = stratify(cgm_data, by, mask=mask, **options)
+    return pd.concat(tables, names=['User'])
@@ -0,0 +1,305 @@
+import sys
+import json
+import asyncio
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from intervals import as_datetime64, label_events
+from read_data import libre_source
+from variability import compute_metrics
+
+## Live mode: readings from a growing Libre export or a local socket are
+## laid onto a fixed size ring buffer of the most recent minutes of the
+## grid, interpolated and labelled the way process_cgm_data does it for a
+## finished export. Memory stays bounded: the buffer never grows and
+## records are dropped once they can no longer label a buffered minute.
+
+minute = np.timedelta64(1, 'm')
+label_columns = [('is_sleep', 'Sleep', None),
+                 ('is_post_prandial', 'Meal', 'time_interval'),
+                 ('is_activity', 'Activity', None)]
+
+
+class LiveGrid(object):
+
+    def __init__(self, capacity=7 * 24 * 60, time_interval=120, max_gap=20):
+        self.capacity = capacity
+        self.time_interval = time_interval
+        self.max_gap = max_gap
+        self.glucose = np.full(capacity, np.nan)
+        self.segment = np.full(capacity, -1, dtype=np.int64)
+        self.flags = {name : np.zeros(capacity, dtype=bool)
+                      for name in ['original_data_point'] +
+                                  [c[0] for c in label_columns]}
+        self.first = self.last = None
+        self.last_glucose = np.nan
+        self.segments = 0
+        self.records = pd.DataFrame({'Start' : as_datetime64([]),
+                                     'Finish' : as_datetime64([]),
+                                     'Event_type' : [],
+                                     'Event_details' : []},
+                                    columns=['Start', 'Finish', 'Event_type',
+                                             'Event_details'])
+
+    def get_minutes(self):
+        ## minutes since the epoch of the buffered grid, oldest first
+        if self.last is None:
+            return np.empty(0, dtype=np.int64)
+        return np.arange(self.first, self.last + 1)
+
+    def add_reading(self, time, glucose):
+        ## number of grid minutes added; readings not newer than the last
+        ## one are ignored
+        now = int(as_datetime64([time])[0].astype('datetime64[m]')
+                                          .astype(np.int64))
+        if self.last is None:
+            self.first = self.last = now
+            self.write(np.array([now]), np.array([glucose]), 0)
+            self.flags['original_data_point'][now % self.capacity] = True
+            self.last_glucose = glucose
+            self.update_labels(np.array([now]))
+            return 1
+        if now <= self.last:
+            return 0
+
+        minutes = np.arange(max(self.last + 1, now - self.capacity + 1),
+                            now + 1)
+        if now - self.last > self.max_gap:
+            ## a new segment, the minutes in the gap have no glucose
+            self.segments += 1
+            values = np.full(minutes.shape[0], np.nan)
+            values[-1] = glucose
+            segment = np.where(minutes == now, self.segments, -1)
+        else:
+            steps = (minutes - self.last) / float(now - self.last)
+            values = self.last_glucose + (glucose - self.last_glucose) * steps
+            segment = self.segments
+        self.write(minutes, values, segment)
+        self.flags['original_data_point'][now % self.capacity] = True
+        if now - self.last > self.max_gap:
+            ## the gap break insert_gap_breaks adds counts as a data point
+            gap_break = self.last + 10
+            if gap_break >= minutes[0]:
+                self.flags['original_data_point'][
+                                        gap_break % self.capacity] = True
+        self.last = now
+        self.first = max(self.first, now - self.capacity + 1)
+        self.last_glucose = glucose
+        self.update_labels(minutes)
+        self.drop_records()
+        return minutes.shape[0]
+
+    def write(self, minutes, values, segment):
+        positions = minutes % self.capacity
+        self.glucose[positions] = values
+        self.segment[positions] = segment
+        for name in self.flags:
+            self.flags[name][positions] = False
+
+    def update_labels(self, minutes):
+        ## one minute before the new ones is labelled with them, so the
+        ## first minute after a finish is found as in the full grid
+        if minutes.shape[0] == 0 or self.records.shape[0] == 0:
+            return
+        times = self.get_times(np.concatenate(([minutes[0] - 1], minutes)))
+        positions = minutes % self.capacity
+        for name, event_type, interval in label_columns:
+            interval = getattr(self, interval) if interval else None
+            labels = label_events(times, self.records, event_type,
+                                    time_interval=interval)
+            self.flags[name][positions] = labels[1:]
+
+    def add_record(self, start, finish, event):
+        ## event is 'Type: details' as in the records files
+        event_type, details = event.split(':', 1)
+        record = pd.DataFrame({'Start' : as_datetime64([start]),
+                               'Finish' : as_datetime64([finish]),
+                               'Event_type' : [event_type.strip()],
+                               'Event_details' : [details.strip()]},
+                              columns=self.records.columns)
+        self.records = pd.concat((self.records, record), ignore_index=True)
+        self.records = self.records.sort_values('Start', kind='mergesort')
+        self.drop_records()
+        self.update_labels(self.get_minutes())
+
+    def drop_records(self):
+        ## records ending before the buffer cannot label it any more
+        if self.first is None or self.records.shape[0] == 0:
+            return
+        ends = np.maximum(as_datetime64(self.records['Finish'].values),
+                          as_datetime64(self.records['Start'].values)
+                            + np.timedelta64(self.time_interval, 'm'))
+        keep = ends >= self.get_times(np.array([self.first - 1]))[0]
+        if not keep.all():
+            self.records = self.records[keep].reset_index(drop=True)
+
+    def get_times(self, minutes):
+        return np.datetime64(0, 'ns') + (minutes * minute).astype(
+                                                        'timedelta64[ns]')
+
+    def get_frame(self):
+        ## the buffered grid, oldest first, with the columns of get_data
+        minutes = self.get_minutes()
+        positions = minutes % self.capacity
+        return pd.DataFrame({'Time' : self.get_times(minutes),
+                             'Glucose (mmol/L)' : self.glucose[positions],
+                             'original_data_point' :
+                                self.flags['original_data_point'][positions],
+                             'segment' : self.segment[positions],
+                             'is_sleep' : self.flags['is_sleep'][positions],
+                             'is_post_prandial' :
+                                self.flags['is_post_prandial'][positions],
+                             'is_activity' :
+                                self.flags['is_activity'][positions]},
+                            columns=['Time', 'Glucose (mmol/L)',
+                                     'original_data_point', 'segment',
+                                     'is_sleep', 'is_post_prandial',
+                                     'is_activity'])
+
+    def get_metrics(self, window=24 * 60, conga_hours=1):
+        ## variability metrics over the last window minutes
+        frame = self.get_frame()
+        return compute_metrics(frame.iloc[-window:], conga_hours=conga_hours)
+
+
+async def tail_lines(fname, poll=0.5, follow=True):
+    ## complete lines of fname, then the lines appended to it
+    buffered = ''
+    with open(fname) as fd:
+        while True:
+            line = fd.readline()
+            if not line:
+                if not follow:
+                    return
+                await asyncio.sleep(poll)
+                continue
+            buffered += line
+            if buffered.endswith('\n'):
+                yield buffered.rstrip('\r\n')
+                buffered = ''
+
+
+async def read_libre_file(fname, poll=0.5, follow=True, source=libre_source):
+    ## ('reading', time, glucose) for every row of a growing export with a
+    ## historic or scan glucose value
+    lines = tail_lines(fname, poll=poll, follow=follow)
+    header = None
+    async for line in lines:
+        fields = line.split(source['sep'])
+        if header is None:
+            header = fields
+            time_at = header.index('Time')
+            historic_at = header.index('Historic Glucose (mmol/L)')
+            scan_at = header.index('Scan Glucose (mmol/L)')
+            continue
+        value = fields[historic_at] or fields[scan_at]
+        if not value:
+            continue
+        time = datetime.strptime(fields[time_at], source['time_format'])
+        yield ('reading', time, float(value))
+
+
+def parse_message(line):
+    ## a json line, {"time": ..., "glucose": ...} for a reading or
+    ## {"start": ..., "finish": ..., "event": "Meal: rice"} for a record
+    message = json.loads(line)
+    if 'glucose' in message:
+        return ('reading', pd.Timestamp(message['time']),
+                float(message['glucose']))
+    return ('record', pd.Timestamp(message['start']),
+            pd.Timestamp(message['finish']), message['event'])
+
+
+def apply_event(live, event):
+    if event[0] == 'reading':
+        return live.add_reading(event[1], event[2])
+    live.add_record(*event[1:])
+    return 0
+
+
+async def consume(live, events, on_update=None):
+    ## feeds events from an async iterator (read_libre_file, read_queue)
+    ## into live, calling on_update(live, event) after each one
+    async for event in events:
+        apply_event(live, event)
+        if on_update is not None:
+            on_update(live, event)
+
+
+async def read_queue(queue):
+    ## events put on an asyncio.Queue, None ends the stream
+    while True:
+        event = await queue.get()
+        if event is None:
+            return
+        yield event
+
+
+async def serve_socket(live, host='127.0.0.1', port=8765, on_update=None):
+    ## json lines from local clients, see parse_message
+    async def handle(reader, writer):
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            try:
+                event = parse_message(line.decode())
+            except (ValueError, KeyError) as error:
+                writer.write('error: {}\n'.format(error).encode())
+                continue
+            apply_event(live, event)
+            if on_update is not None:
+                on_update(live, event)
+        writer.close()
+    return await asyncio.start_server(handle, host, port)
+
+
+def print_update(live, event):
+    if event[0] != 'reading':
+        print('record {}'.format(event[3]))
+        return
+    position = live.last % live.capacity
+    labels = [name for name, event_type, interval in label_columns
+                    if live.flags[name][position]]
+    print('{} {:.1f} mmol/L {}'.format(event[1], event[2], ' '.join(labels)))
+
+
+async def follow(live, fname=None, port=None, on_update=None):
+    ## runs until the file source ends, or forever with only a socket
+    server = None
+    if port:
+        server = await serve_socket(live, port=port, on_update=on_update)
+    try:
+        if fname:
+            await consume(live, read_libre_file(fname), on_update=on_update)
+        else:
+            await server.serve_forever()
+    finally:
+        if server is not None:
+            server.close()
+            await server.wait_closed()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+                description='Follow a growing Libre export or a socket')
+    parser.add_argument('--file', help='Libre export to follow')
+    parser.add_argument('--port', type=int,
+                        help='listen for json lines on localhost')
+    parser.add_argument('--capacity', type=int, default=7 * 24 * 60,
+                        help='minutes of grid to keep')
+    args = parser.parse_args(argv)
+    if not args.file and not args.port:
+        parser.error('give --file or --port')
+
+    live = LiveGrid(capacity=args.capacity)
+    try:
+        asyncio.run(follow(live, fname=args.file, port=args.port,
+                           on_update=print_update))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
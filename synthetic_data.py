@@ -0,0 +1,160 @@
+import os
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from read_data import libre_source, config
+
+## Writes a libre_data.txt and one records file per user in the formats
+## declared in read_data.config, with made up but plausible glucose curves:
+## a daily rhythm, a rise after every meal, a dip during activity, sensor
+## gaps and a mix of historic and scan readings.
+
+meal_names = ['bread and jam', 'chicken rice', 'noodles', 'salad', 'subway',
+              'chapati', 'fruit', 'ice tea']
+activity_names = ['walk', 'run', 'gym', 'cycling']
+
+
+def format_times(times, source):
+    times = pd.DatetimeIndex(times)
+    strings = pd.Series(times.strftime(source['time_format']))
+    for old, new in sorted((source.get('replace') or {}).items()):
+        strings = strings.str.replace(new, old, regex=False)
+    return strings.values
+
+
+def get_events(rng, start_date, days, meals_per_day=3, activities_per_day=1):
+    ## sleep every night, meals around usual meal times and some activity
+    day_starts = [start_date + timedelta(day) for day in range(days)]
+    events = []
+    for day in day_starts:
+        sleep = day + timedelta(hours=23, minutes=int(rng.randint(-60, 60)))
+        hours = int(rng.randint(6, 9))
+        events.append((sleep, sleep + timedelta(hours=hours), 'Sleep',
+                        'night'))
+        for hour in np.linspace(8, 20, meals_per_day):
+            start = day + timedelta(hours=hour,
+                                    minutes=int(rng.randint(-45, 45)))
+            events.append((start, start + timedelta(minutes=30), 'Meal',
+                            rng.choice(meal_names)))
+        for n in range(activities_per_day):
+            start = day + timedelta(hours=int(rng.randint(7, 19)))
+            duration = timedelta(minutes=int(rng.randint(20, 90)))
+            events.append((start, start + duration, 'Activity',
+                            rng.choice(activity_names)))
+    events = pd.DataFrame(events, columns=['Start', 'Finish', 'Event_type',
+                                           'Event_details'])
+    return events.sort_values('Start').reset_index(drop=True)
+
+
+def get_glucose(rng, times, events):
+    ## mmol/L at the given times
+    t = (times - times[0]) / np.timedelta64(1, 'h')
+    glucose = 5.5 + 0.4 * np.sin(2 * np.pi * (t - 4) / 24)
+    glucose = glucose + np.cumsum(rng.normal(0, 0.02, times.shape[0]))
+    glucose = glucose - np.linspace(0, glucose[-1] - 5.5, times.shape[0])
+    for start, finish, event_type in zip(events['Start'], events['Finish'],
+                                         events['Event_type']):
+        since = (times - np.datetime64(start)) / np.timedelta64(1, 'm')
+        after = since >= 0
+        if event_type == 'Meal':
+            height = rng.uniform(1.5, 5)
+            peak = rng.uniform(30, 60)
+            glucose[after] += (height * (since[after] / peak)
+                                * np.exp(1 - since[after] / peak))
+        elif event_type == 'Activity':
+            duration = (finish - start) / timedelta(minutes=1)
+            inside = after & (since <= duration)
+            glucose[inside] -= 0.8 * np.sin(np.pi * since[inside] / duration)
+    return np.clip(glucose, 2.2, 22).round(1)
+
+
+def get_readings(rng, start_date, days, events, n_gaps=2,
+                    scans_per_day=10):
+    ## historic readings every 15 minutes, scans at random times, and
+    ## gaps of 30 minutes to 12 hours without historic readings
+    offset = timedelta(minutes=int(rng.randint(1, 16)))
+    first = np.datetime64(start_date + offset, 'm')
+    steps = np.arange(0, days * 24 * 60, 15).astype('timedelta64[m]')
+    historic = first + steps
+    keep = np.ones(historic.shape[0], dtype=bool)
+    for n in range(n_gaps):
+        gap_start = int(rng.randint(historic.shape[0]))
+        keep[gap_start:gap_start + int(rng.randint(2, 48))] = False
+    historic = historic[keep]
+    scans = first + np.sort(rng.randint(0, days * 24 * 60,
+                                         scans_per_day * days)
+                            ).astype('timedelta64[m]')
+
+    times = np.concatenate((historic, scans)).astype('datetime64[ns]')
+    glucose = get_glucose(rng, np.sort(times), events)
+    glucose = glucose[np.argsort(np.argsort(times))]
+    is_scan = np.arange(times.shape[0]) >= historic.shape[0]
+    return times, glucose, is_scan
+
+
+def write_libre_data(path, readings):
+    times, glucose, is_scan = readings
+    order = np.argsort(times, kind='mergesort')
+    data = pd.DataFrame({
+        'ID' : np.arange(times.shape[0]) + 1,
+        'Time' : format_times(times[order], libre_source),
+        'Record Type' : is_scan[order].astype(int),
+        'Historic Glucose (mmol/L)' : np.where(is_scan, np.nan,
+                                                glucose)[order],
+        'Scan Glucose (mmol/L)' : np.where(is_scan, glucose, np.nan)[order],
+        }, columns=['ID', 'Time', 'Record Type', 'Historic Glucose (mmol/L)',
+                    'Scan Glucose (mmol/L)'])
+    data.to_csv(os.path.join(path, libre_source['file']), sep='\t',
+                    index=False, na_rep='')
+
+
+def write_records(path, events, source):
+    records = pd.DataFrame({
+        'Start' : format_times(events['Start'].values, source),
+        'Event' : (events['Event_type'] + ': '
+                    + events['Event_details']).values,
+        })
+    if 'duration' in source:
+        duration = (events['Finish'] - events['Start']) / timedelta(minutes=1)
+        records[source['duration']] = duration.astype(int).values
+        records = records[['Start', source['duration'], 'Event']]
+    else:
+        records['Finish'] = format_times(events['Finish'].values, source)
+        records = records[['Start', 'Finish', 'Event']]
+    records.to_csv(os.path.join(path, source['file']), index=False)
+
+
+def generate_data(root='.', n_users=4, days=14, n_gaps=2, scans_per_day=10,
+                    meals_per_day=3, activities_per_day=1, seed=0):
+    ## writes root/data/raw and returns config entries for the new users.
+    ## Users take turns using the records formats of the configured users
+    ## and follow each other in time in the shared export.
+    rng = np.random.RandomState(seed)
+    path = os.path.join(root, 'data', 'raw')
+    if not os.path.exists(path):
+        os.makedirs(path)
+
+    sources = [config[user]['records'] for user in sorted(config)]
+    users = {}
+    readings = []
+    start_date = datetime(2018, 1, 1)
+    for n in range(n_users):
+        user = 'user{}'.format(n)
+        source = dict(sources[n % len(sources)])
+        source['file'] = 'records_{}.csv'.format(user)
+        if 'year' in source:
+            source['year'] = start_date.year
+        events = get_events(rng, start_date, days,
+                            meals_per_day=meals_per_day,
+                            activities_per_day=activities_per_day)
+        readings.append(get_readings(rng, start_date, days, events,
+                                        n_gaps=n_gaps,
+                                        scans_per_day=scans_per_day))
+        write_records(path, events, source)
+        users[user] = {'start_date' : start_date,
+                       'end_date' : start_date + timedelta(days),
+                       'records' : source}
+        start_date = start_date + timedelta(days)
+
+    write_libre_data(path, [np.concatenate(r) for r in zip(*readings)])
+    return users
@@ -0,0 +1,30 @@
+import os
+import sys
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import read_data
+from synthetic_data import generate_data
+
+
+@pytest.fixture
+def users(tmp_path, monkeypatch):
+    ## synthetic raw data in a fresh directory, with read_data.config and its
+    ## caches holding only the synthetic users for the test
+    monkeypatch.chdir(tmp_path)
+    saved = dict(read_data.config)
+    users = generate_data('.', n_users=2, days=5)
+    read_data.config.clear()
+    read_data.config.update(users)
+    clear_caches()
+    yield sorted(users)
+    read_data.config.clear()
+    read_data.config.update(saved)
+    clear_caches()
+
+
+def clear_caches():
+    read_data.libre_store.clear()
+    read_data.store_cache.clear()
+    read_data.data_cache.clear()
@@ -0,0 +1,15 @@
+import os
+from meal_windows import select_meals
+from batch_reports import run_batch
+
+
+def test_index_lists_every_batch_report(users):
+    meals = select_meals()
+    items = [{'fname' : 'batch_{}.html'.format(n), 'meals' : meals[n:n + 2]}
+             for n in range(0, 8, 2)]
+    assert run_batch(items, workers=2, root='html') == {}
+    with open(os.path.join('html', 'index.html')) as fd:
+        index = fd.read()
+    for item in items:
+        assert os.path.exists(os.path.join('html', item['fname']))
+        assert 'href="{}"'.format(item['fname']) in index
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+import cache
+from read_data import get_data
+
+
+@pytest.mark.parametrize('copy_on_write', [True, False])
+def test_get_data_shares_cached_arrays(users, monkeypatch, copy_on_write):
+    monkeypatch.setattr(cache, 'has_copy_on_write', lambda: copy_on_write)
+    records, first = get_data(users[0])
+    records, second = get_data(users[0])
+    glucose = first['Glucose (mmol/L)'].values
+    assert np.shares_memory(glucose, second['Glucose (mmol/L)'].values)
+    if copy_on_write:
+        ## a reassigned column stays in the caller's frame
+        first['Glucose (mmol/L)'] = first['Glucose (mmol/L)'] * 18
+        records, third = get_data(users[0])
+        assert np.array_equal(third['Glucose (mmol/L)'].values,
+                              second['Glucose (mmol/L)'].values,
+                              equal_nan=True)
+    else:
+        with pytest.raises(ValueError):
+            glucose[0] = 0.
+
+    records, copied = get_data(users[0], copy=True)
+    values = copied['Glucose (mmol/L)'].values
+    assert not np.shares_memory(values, second['Glucose (mmol/L)'].values)
@@ -0,0 +1,37 @@
+import numpy as np
+from read_data import get_data
+from compact import compact_cgm_data, expand_cgm_data, get_column
+from strata import stratify
+from variability import get_metrics
+
+
+def test_round_trip(users):
+    for user in users:
+        records, cgm_data = get_data(user)
+        records, compact = get_data(user, compact=True)
+        expanded = expand_cgm_data(compact)
+        assert list(expanded.columns) == list(cgm_data.columns)
+        for column in cgm_data.columns.drop('Glucose (mmol/L)'):
+            assert (expanded[column].values == cgm_data[column].values).all()
+        assert np.allclose(expanded['Glucose (mmol/L)'].values,
+                           cgm_data['Glucose (mmol/L)'].values,
+                           rtol=1e-6, equal_nan=True)
+        for column in cgm_data.columns.drop('Glucose (mmol/L)'):
+            assert (get_column(compact, column)
+                        == cgm_data[column].values).all()
+
+
+def test_analyses_take_compact_grids(users):
+    records, cgm_data = get_data(users[0])
+    compact = compact_cgm_data(cgm_data)
+    by = ['sleep', 'post_prandial', 'hour']
+    full = stratify(cgm_data, by, original_only=True)
+    small = stratify(compact, by, original_only=True)
+    assert (full['Time (minutes)'] == small['Time (minutes)']).all().all()
+    ## glucose is float32 in the compact grid
+    assert np.allclose(full.values, small.values, atol=1e-5, equal_nan=True)
+
+    subsets = {'sleep' : lambda grid: get_column(grid, 'is_sleep')}
+    assert np.allclose(get_metrics(users, subsets).values,
+                       get_metrics(users, subsets, compact=True).values,
+                       atol=1e-5, equal_nan=True)
@@ -0,0 +1,40 @@
+import os
+import shutil
+import pandas as pd
+import read_data
+from datetime import timedelta
+from read_data import get_data, libre_source, config
+from conftest import clear_caches
+
+
+def test_incremental_matches_rebuild(users, monkeypatch):
+    ## a store built from an export cut in the middle of the user's period
+    ## and extended with the rest equals one built from the whole export
+    user = users[0]
+    fname = os.path.join('data', 'raw', libre_source['file'])
+    with open(fname) as fd:
+        lines = fd.readlines()
+    cut = (config[user]['start_date'] + timedelta(days=2, hours=5, minutes=7)
+            ).strftime(libre_source['time_format'])
+    header, rows = lines[0], lines[1:]
+    with open(fname, 'w') as fd:
+        fd.writelines([header] + [row for row in rows
+                                  if row.split('\t')[1] <= cut])
+    records, partial = get_data(user)
+    assert partial['Time'].iloc[-1] <= pd.Timestamp(cut)
+
+    with open(fname, 'w') as fd:
+        fd.writelines(lines)
+    appended = []
+    append_cgm_data = read_data.append_cgm_data
+    def count_append(*args, **kwargs):
+        appended.append(append_cgm_data(*args, **kwargs))
+        return appended[-1]
+    monkeypatch.setattr(read_data, 'append_cgm_data', count_append)
+    records, extended = get_data(user, incremental=True)
+    assert appended and appended[0] > 0
+
+    shutil.rmtree(os.path.join('data', 'pkl'))
+    clear_caches()
+    records, rebuilt = get_data(user)
+    assert extended.equals(rebuilt)
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+from intervals import IntervalSet, RecordIndex
+
+origin = np.datetime64('2018-01-01T00:00', 'ns')
+
+
+def minutes(values):
+    return origin + (np.asarray(values, dtype=float) * 60e9).astype(
+                                                        'timedelta64[ns]')
+
+
+def random_set(rng, n_minutes=100):
+    n = rng.randint(0, 5)
+    starts = rng.randint(0, n_minutes, n)
+    return IntervalSet(minutes(starts),
+                       minutes(starts + rng.randint(1, 20, n)))
+
+
+def test_empty_sets():
+    empty = IntervalSet([], [])
+    day = IntervalSet(minutes([0]), minutes([60]))
+    other = IntervalSet(minutes([120]), minutes([180]))
+    assert len(empty) == 0
+    assert empty.starts.dtype == np.dtype('datetime64[ns]')
+    assert not empty.contains(minutes([0])).any()
+    assert len(day & other) == 0
+    assert len(day - day) == 0
+    assert len(empty & day) == 0
+    assert len(empty | empty) == 0
+    assert (day | empty).to_frame().equals(day.to_frame())
+    assert len(~empty) == 1
+
+
+def test_missing_event_type():
+    records = pd.DataFrame({'Start' : minutes([0, 30]),
+                            'Finish' : minutes([10, 40]),
+                            'Event_type' : ['Meal', 'Sleep'],
+                            'Event_details' : ['rice', '']})
+    index = RecordIndex(records)
+    assert len(index.events('Activity')) == 0
+    assert not index.during(minutes([5, 35]), 'Activity').any()
+    assert list(index.during(minutes([5, 35]), 'Meal')) == [True, False]
+
+
+def test_operations_match_minute_masks():
+    ## the sets as spans of time: the middle of every minute is inside a
+    ## result exactly when the rule holds for the operands there
+    rng = np.random.RandomState(0)
+    middles = minutes(np.arange(0, 130) + 0.5)
+    for n in range(500):
+        a, b = random_set(rng), random_set(rng)
+        in_a, in_b = a.contains(middles), b.contains(middles)
+        assert ((a | b).contains(middles) == (in_a | in_b)).all()
+        assert ((a & b).contains(middles) == (in_a & in_b)).all()
+        assert ((a - b).contains(middles) == (in_a & ~in_b)).all()
+        assert ((~a).contains(middles) == ~in_a).all()
+        ## a union of closed intervals keeps every instant of both
+        whole = minutes(np.arange(0, 130))
+        assert ((a | b).contains(whole)
+                    == (a.contains(whole) | b.contains(whole))).all()
@@ -0,0 +1,76 @@
+import numpy as np
+import pandas as pd
+from read_data import get_data
+from intervals import label_intervals
+
+
+def scan_labels(times, starts, finishes):
+    ## the row by row scan add_sleep_info and add_postprandial_info used
+    ## before label_intervals
+    labels = [False] * len(times)
+    i = j = 0
+    while i < len(times) and j < len(starts):
+        if times[i] <= starts[j]:
+            i += 1
+        elif times[i] > starts[j]:
+            labels[i] = True
+            i += 1
+        if times[i - 1] > finishes[j]:
+            j += 1
+    return np.array(labels)
+
+
+def get_windows(records, event_type, time_interval=None):
+    events = records[records['Event_type'] == event_type]
+    starts = list(events['Start'])
+    if time_interval is None:
+        return starts, list(events['Finish'])
+    return starts, [s + pd.Timedelta(minutes=time_interval) for s in starts]
+
+
+def test_labels_match_scan(users):
+    for user in users:
+        records, cgm_data = get_data(user)
+        times = list(cgm_data['Time'])
+        for column, event_type, time_interval in [
+                    ('is_sleep', 'Sleep', None),
+                    ('is_post_prandial', 'Meal', 120),
+                    ('is_activity', 'Activity', None)]:
+            expected = scan_labels(times, *get_windows(records, event_type,
+                                                       time_interval))
+            assert (cgm_data[column].values == expected).all(), column
+
+
+def test_label_intervals_edges():
+    ## start itself is not labelled, the first time after finish is
+    times = np.arange(10).astype('datetime64[m]').astype('datetime64[ns]')
+    starts = times[[2, 6]]
+    finishes = times[[4, 6]]
+    labels = label_intervals(times, starts, finishes)
+    assert list(np.where(labels)[0]) == [3, 4, 5, 7]
+    assert (labels == scan_labels(list(times), list(starts),
+                                  list(finishes))).all()
+
+
+def test_label_intervals_overlapping_records():
+    ## nested records and records sharing a start, e.g. two meals logged
+    ## together, get the labels of the scan too
+    times = np.arange(12).astype('datetime64[m]').astype('datetime64[ns]')
+    starts = times[[2, 2, 3]]
+    finishes = times[[5, 3, 4]]
+    labels = label_intervals(times, starts, finishes)
+    assert list(np.where(labels)[0]) == [3, 4, 5, 6, 7, 8]
+    assert (labels == scan_labels(list(times), list(starts),
+                                  list(finishes))).all()
+
+    rng = np.random.RandomState(0)
+    for n in range(1000):
+        times = np.sort(rng.choice(200, rng.randint(1, 40), replace=False))
+        starts = np.sort(rng.randint(0, 60, rng.randint(1, 8)) * 3)
+        finishes = starts + rng.randint(0, 80, starts.shape[0])
+        times, starts, finishes = [
+                    v.astype('datetime64[m]').astype('datetime64[ns]')
+                    for v in [times, starts, finishes]]
+        assert (label_intervals(times, starts, finishes)
+                    == scan_labels(list(times), list(starts),
+                                   list(finishes))).all()
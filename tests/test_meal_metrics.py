@@ -0,0 +1,57 @@
+from collections import OrderedDict
+import numpy as np
+import meal_metrics
+from meal_metrics import get_incremental_auc, get_meal_metrics
+
+
+def get_curve():
+    ## 5 mmol/L at the meal, up to 8 at 60 minutes, back to 5 at 120 and
+    ## below the baseline after that
+    minutes = np.arange(0, 241)
+    glucose = np.interp(minutes, [0, 60, 120, 180, 240], [5, 8, 5, 4, 4.5])
+    return minutes, glucose
+
+
+def test_incremental_auc():
+    minutes, glucose = get_curve()
+    glucose = glucose[None, :]
+    baseline = glucose[:, 0]
+    assert np.allclose(get_incremental_auc(minutes, glucose, baseline, 120),
+                       0.5 * 120 * 3)
+    ## the dip below the baseline does not count
+    assert np.allclose(get_incremental_auc(minutes, glucose, baseline, 240),
+                       0.5 * 120 * 3)
+
+
+def test_meal_metrics_on_built_windows(monkeypatch):
+    minutes, glucose = get_curve()
+    gappy = glucose.copy()
+    gappy[200] = np.nan
+    activity = np.zeros((2, minutes.shape[0]))
+    activity[0, :30] = 1
+    windows = OrderedDict([('Glucose (mmol/L)', np.vstack((glucose, gappy))),
+                           ('is_activity', activity),
+                           ('is_sleep', np.zeros((2, minutes.shape[0])))])
+    monkeypatch.setattr(meal_metrics, 'extract_meal_columns',
+                        lambda meals, names, interval: (minutes, windows))
+    monkeypatch.setattr(meal_metrics, 'get_meal_records',
+                        lambda meals: (np.zeros(2, dtype='datetime64[ns]'),
+                                       np.array(['rice', 'noodles'])))
+    table = get_meal_metrics([('A', 0), ('A', 1)])
+
+    whole, gap = table.iloc[0], table.iloc[1]
+    assert whole['Baseline (mmol/L)'] == 5
+    assert whole['Peak (mmol/L)'] == 8
+    assert whole['Time to peak (min)'] == 60
+    assert np.isclose(whole['iAUC 120 (mmol/L x min)'], 180)
+    assert np.isclose(whole['iAUC 240 (mmol/L x min)'], 180)
+    assert whole['Time to baseline (min)'] == 120
+    assert whole['Activity overlap (min)'] == 30
+    assert whole['Missing (min)'] == 0
+
+    ## a gap at 200 minutes leaves the first two hours alone
+    assert np.isclose(gap['iAUC 120 (mmol/L x min)'], 180)
+    assert np.isnan(gap['iAUC 240 (mmol/L x min)'])
+    assert np.isnan(gap['Peak (mmol/L)'])
+    assert gap['Time to baseline (min)'] == 120
+    assert gap['Missing (min)'] == 1
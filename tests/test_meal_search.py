@@ -0,0 +1,47 @@
+import os
+import numpy as np
+import meal_search
+from meal_search import MealIndex, load_index
+from read_data import config
+from conftest import clear_caches
+
+
+def test_saved_index_is_reused(users, monkeypatch):
+    ## a second run loads the saved rows instead of resampling the meals
+    built = load_index()
+    assert len(built.meals) > 0
+    assert [p for p in os.listdir(os.path.join('data', 'pkl'))
+                if p.startswith('meal_index_')]
+
+    clear_caches()
+    selected = []
+    select_meals = meal_search.select_meals
+    def count_select(*args, **kwargs):
+        selected.append(kwargs)
+        return select_meals(*args, **kwargs)
+    monkeypatch.setattr(meal_search, 'select_meals', count_select)
+    loaded = load_index()
+    assert selected == []
+    assert loaded.meals == built.meals
+    assert np.array_equal(loaded.curves, built.curves)
+    assert loaded.search(built.meals[0]).equals(
+                MealIndex().update().search(built.meals[0]))
+
+
+def test_saved_indexes_per_parameters(users):
+    load_index(step=5)
+    load_index(step=10)
+    names = [p for p in os.listdir(os.path.join('data', 'pkl'))
+                if p.startswith('meal_index_')]
+    assert len(names) == 2
+
+
+def test_users_leaving_config_are_dropped(users):
+    built = load_index()
+    assert set(user for user, record in built.meals) == set(users)
+    del config[users[1]]
+    loaded = load_index()
+    assert set(user for user, record in loaded.meals) == {users[0]}
+    assert list(loaded.keys) == [users[0]]
+    assert loaded.curves.shape[0] == len(loaded.meals)
+    assert MealIndex().load().meals == loaded.meals
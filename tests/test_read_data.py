@@ -0,0 +1,61 @@
+import os
+import numpy as np
+import pytest
+import pandas as pd
+from intervals import IntervalSet, as_datetime64
+from read_data import (load_libre_data, read_cgm_data, remove_stale_files,
+                       find_segments, insert_gap_breaks, expand_time,
+                       config, libre_source)
+
+
+def test_libre_store_keeps_user_windows(users):
+    fname = os.path.join('data', 'raw', libre_source['file'])
+    everything = IntervalSet([np.datetime64('1970-01-01')],
+                             [np.datetime64('2100-01-01')])
+    whole = load_libre_data(fname, windows=everything, chunksize=100)
+
+    del config[users[0]]
+    window = load_libre_data(fname, chunksize=100)
+    start, end = config[users[1]]['start_date'], config[users[1]]['end_date']
+    assert window['Time'].min() >= start
+    assert window['Time'].max() <= end
+
+    expected = whole[(whole['Time'] > start) & (whole['Time'] <= end)]
+    got = read_cgm_data(libre_source['file'], start, end)
+    assert got.reset_index(drop=True).equals(expected.reset_index(drop=True))
+
+
+def test_remove_stale_files_matches_user_exactly(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    names = ['A_0123abcd_cgm', 'A_0123abcd_records', 'A_4567ef01_cgm',
+             'A_1_89abcdef_cgm', 'A_1_89abcdef_records']
+    for name in names:
+        os.makedirs(os.path.join('data', 'pkl', name))
+    remove_stale_files('A', '0123abcd')
+    assert sorted(os.listdir(os.path.join('data', 'pkl'))) == [
+                'A_0123abcd_cgm', 'A_0123abcd_records',
+                'A_1_89abcdef_cgm', 'A_1_89abcdef_records']
+
+
+def test_expand_time_matches_interp1d(users):
+    ## the grid expand_time gave when it interpolated with scipy
+    interpolate = pytest.importorskip('scipy.interpolate')
+    user = users[0]
+    cgm_data = read_cgm_data(libre_source['file'], config[user]['start_date'],
+                             config[user]['end_date']).sort_values('Time')
+    cgm_data['Glucose (mmol/L)'] = cgm_data['Historic Glucose (mmol/L)'
+                                ].fillna(cgm_data['Scan Glucose (mmol/L)'])
+    segments = find_segments(cgm_data['Time'].values)
+    data = insert_gap_breaks(cgm_data[['Time', 'Glucose (mmol/L)']], segments)
+    grid = expand_time(data, segments=segments)
+
+    t = as_datetime64(data['Time'].values).astype(np.int64) / 1e9
+    new_t = np.arange(t[0], t[-1] + 1, 60)
+    new_g = interpolate.interp1d(t, data['Glucose (mmol/L)'].values)(new_t)
+    assert (as_datetime64(grid['Time'].values).astype(np.int64)
+                == (new_t * 1e9).astype(np.int64)).all()
+    assert np.allclose(grid['Glucose (mmol/L)'].values, new_g, equal_nan=True)
+    assert (grid['original_data_point'].values
+                == pd.Series(new_t * 1e9).astype(np.int64).isin(
+                    as_datetime64(data['Time'].values).astype(np.int64))
+                    .values).all()
@@ -0,0 +1,39 @@
+import numpy as np
+import pandas as pd
+from report_site import compact_figure
+
+
+def get_trace(figure):
+    return compact_figure({'data' : [figure], 'layout' : {}})['data'][0]
+
+
+def test_even_time_axis_becomes_start_and_step():
+    times = pd.date_range('2018-01-01 08:00', periods=5, freq='min')
+    trace = get_trace({'type' : 'scatter', 'x' : times.values,
+                       'y' : [5., 5.5, 6., np.nan, 6.5]})
+    assert 'x' not in trace
+    assert trace['x0'] == '2018-01-01T08:00'
+    assert trace['dx'] == 60000
+    assert trace['y'] == [5., 5.5, 6., None, 6.5]
+
+    trace = get_trace({'type' : 'scatter', 'x' : [0, 5, 10, 15],
+                       'y' : [1, 2, 3, 4]})
+    assert (trace['x0'], trace['dx']) == (0, 5)
+
+
+def test_irregular_axes_are_kept():
+    times = pd.to_datetime(['2018-01-01 08:00', '2018-01-01 08:01',
+                            '2018-01-01 08:03'])
+    trace = get_trace({'type' : 'scatter', 'x' : times.values,
+                       'y' : [1, 2, 3]})
+    assert 'x0' not in trace
+    assert trace['x'] == ['2018-01-01T08:00', '2018-01-01T08:01',
+                          '2018-01-01T08:03']
+
+    ## NaT breaks a line, so the times stay as they are
+    times = np.array(['2018-01-01T08:00', 'NaT', '2018-01-01T08:02',
+                      '2018-01-01T08:03'], dtype='datetime64[ns]')
+    trace = get_trace({'type' : 'scatter', 'x' : times, 'y' : [1, 2, 3, 4]})
+    assert 'x0' not in trace
+    assert trace['x'] == ['2018-01-01T08:00', 'NaT', '2018-01-01T08:02',
+                          '2018-01-01T08:03']
@@ -0,0 +1,28 @@
+import numpy as np
+import pandas as pd
+from read_data import get_data
+from strata import stratify
+
+
+def test_stratify_matches_groupby(users):
+    records, cgm_data = get_data(users[0])
+    table = stratify(cgm_data, ['sleep', 'day_type'])
+
+    frame = cgm_data[cgm_data['Glucose (mmol/L)'].notnull()]
+    weekend = frame['Time'].dt.dayofweek.values >= 5
+    groups = frame.groupby([np.where(frame['is_sleep'], 'sleep', 'awake'),
+                            np.where(weekend, 'weekend', 'weekday')]
+                           )['Glucose (mmol/L)']
+    expected = pd.DataFrame({'count' : groups.count(), 'mean' : groups.mean(),
+                             'sd' : groups.std(), 'median' : groups.median()})
+    glucose = table['Glucose (mmol/L)'].loc[expected.index]
+    assert (glucose['count'].values == expected['count'].values).all()
+    assert np.allclose(glucose['mean'].values, expected['mean'].values)
+    assert np.allclose(glucose['sd'].values, expected['sd'].values)
+    assert np.allclose(glucose['50%'].values, expected['median'].values)
+    ## every grid minute with glucose falls in one range
+    minutes = table['Time (minutes)'].sum(axis=1).loc[expected.index]
+    assert (minutes.values == expected['count'].values).all()
+    ## strata with no data are rows of zeros
+    empty = table.index.difference(expected.index)
+    assert (table['Glucose (mmol/L)', 'count'].loc[empty] == 0).all()
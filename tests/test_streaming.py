@@ -0,0 +1,22 @@
+import os
+import asyncio
+import numpy as np
+from read_data import get_data, libre_source
+from streaming import LiveGrid, consume, read_libre_file
+
+
+def test_live_grid_matches_batch(users):
+    ## an export fed through the file source lays the same readings on the
+    ## grid as get_data does
+    live = LiveGrid(capacity=20 * 24 * 60)
+    fname = os.path.join('data', 'raw', libre_source['file'])
+    asyncio.run(consume(live, read_libre_file(fname, follow=False)))
+    frame = live.get_frame().set_index('Time')
+
+    records, cgm_data = get_data(users[0])
+    cgm_data = cgm_data.set_index('Time')
+    live_data = frame.loc[cgm_data.index]
+    assert np.allclose(live_data['Glucose (mmol/L)'].values,
+                       cgm_data['Glucose (mmol/L)'].values, equal_nan=True)
+    assert (live_data['original_data_point'].values
+                == cgm_data['original_data_point'].values).all()
@@ -0,0 +1,17 @@
+import numpy as np
+from variability import get_excursions, get_mage
+
+
+def test_excursions_need_confirmation():
+    ## 5 -> 9 is confirmed by the fall to 6, 9 -> 6 by the rise to 10; the
+    ## last rise to 10 is never followed by a fall and is not counted
+    values = [5, 7, 9, 8, 6, 8, 10]
+    assert get_excursions(values, 1.5) == [4, 3]
+    assert get_excursions([5, 6, 7, 9], 1.5) == []
+
+
+def test_mage_keeps_runs_apart():
+    glucose = np.array([5, 9, 5, 9, 5, 9], dtype=float)
+    runs = np.array([0, 0, 0, 1, 1, 1])
+    ## each run has one confirmed swing of 4
+    assert get_mage(glucose, runs, 1) == 4
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+
+## glucose range thresholds in mmol/L. 'consensus' follows the
+## international consensus on time in range (3.0, 3.9, 10.0, 13.9).
+range_thresholds = {
+    'default'   : [2, 4, 6, 8, 10],
+    'consensus' : [3.0, 3.9, 10.0, 13.9],
+}
+
+
+def get_range_labels(thresholds):
+    labels = ['< {:g} mmol/L'.format(thresholds[0])]
+    for low, high in zip(thresholds[:-1], thresholds[1:]):
+        labels.append('{:g} - {:g} mmol/L'.format(low, high))
+    labels.append('> {:g} mmol/L'.format(thresholds[-1]))
+    return labels
+
+
+def get_glucose_ranges(glucose, thresholds=range_thresholds['default']):
+    ## bin i holds thresholds[i-1] <= glucose < thresholds[i], missing
+    ## glucose values get no bin
+    glucose = np.asarray(glucose)
+    if glucose.dtype != np.float32:
+        glucose = glucose.astype(float)
+    ## rounded and compared in the precision of the data, so interpolation
+    ## noise (7.999999999999999) and float32 glucose from
+    ## compact.compact_cgm_data do not move values across a threshold
+    glucose = np.round(glucose, 6)
+    thresholds = np.asarray(thresholds, dtype=glucose.dtype)
+    codes = np.searchsorted(thresholds, glucose, side='right')
+    codes[np.isnan(glucose)] = -1
+    return pd.Categorical.from_codes(codes, get_range_labels(thresholds))
+
+
+def time_in_range(ranges, mask=None):
+    ## minutes and percentage of time in each bin of a categorical from
+    ## get_glucose_ranges(), on a one minute grid
+    ranges = pd.Categorical(ranges)
+    codes = np.asarray(ranges.codes)
+    if mask is not None:
+        codes = codes[np.asarray(mask, dtype=bool)]
+    n_bins = len(ranges.categories)
+    minutes = np.bincount(codes[codes >= 0], minlength=n_bins)
+    total = max(minutes.sum(), 1)
+    return pd.DataFrame({'Time (minutes)' : minutes,
+                         'Time (%)' : minutes * 100. / total},
+                        index=ranges.categories,
+                        columns=['Time (minutes)', 'Time (%)'])
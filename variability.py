@@ -0,0 +1,180 @@
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from read_data import get_data, config
+
+## Glycemic variability on the one minute grid from read_data.get_data, so
+## every metric is time weighted. A metric only uses grid points inside the
+## subset mask and inside a gap segment: rolling windows and excursions
+## never cross a gap or leave the mask, and differences over a lag (CONGA,
+## MODD) need both ends in the mask and outside gaps.
+
+mg_per_mmol = 18.0
+
+
+def get_runs(glucose, segment, mask=None):
+    ## id of every stretch of consecutive grid points in one segment and
+    ## inside the mask, -1 elsewhere
+    segment = np.asarray(segment)
+    valid = (segment >= 0) & ~np.isnan(glucose)
+    if mask is not None:
+        valid &= np.asarray(mask, dtype=bool)
+    starts = valid.copy()
+    starts[1:] &= ~(valid[:-1] & (segment[1:] == segment[:-1]))
+    return np.where(valid, np.cumsum(starts) - 1, -1)
+
+
+def rolling_stats(glucose, runs, window=60):
+    ## mean and SD over the window minutes ending at every point, NaN where
+    ## the window does not fit in the point's run
+    n = glucose.shape[0]
+    valid = runs >= 0
+    centre = glucose[valid].mean() if valid.any() else 0.
+    g = np.where(valid, glucose - centre, 0.)
+    sums = np.concatenate(([0.], np.cumsum(g)))
+    squares = np.concatenate(([0.], np.cumsum(g * g)))
+
+    end = np.arange(n) + 1
+    start = np.maximum(end - window, 0)
+    inside = valid & (end - window >= 0)
+    inside[inside] = runs[start[inside]] == runs[inside]
+
+    mean = (sums[end] - sums[start]) / window
+    var = (squares[end] - squares[start]) / window - mean ** 2
+    sd = np.sqrt(np.maximum(var, 0) * window / max(window - 1, 1))
+    return (np.where(inside, mean + centre, np.nan),
+            np.where(inside, sd, np.nan))
+
+
+def rolling_glucose(cgm_data, window=60, mask=None):
+    glucose = cgm_data['Glucose (mmol/L)'].values.astype(float)
+    runs = get_runs(glucose, cgm_data['segment'].values, mask)
+    mean, sd = rolling_stats(glucose, runs, window=window)
+    return pd.DataFrame({'Rolling mean (mmol/L)' : mean,
+                         'Rolling SD (mmol/L)' : sd},
+                        index=cgm_data.index,
+                        columns=['Rolling mean (mmol/L)',
+                                 'Rolling SD (mmol/L)'])
+
+
+def lag_differences(glucose, valid, lag):
+    ## glucose(t) - glucose(t - lag minutes) where both ends are valid
+    if lag >= glucose.shape[0]:
+        return np.empty(0)
+    both = valid[lag:] & valid[:-lag]
+    return (glucose[lag:] - glucose[:-lag])[both]
+
+
+def get_turning_points(glucose, runs):
+    ## grid points that are not strictly between their neighbours in the
+    ## same run; the linear interpolation in between cannot add extremes
+    index = np.where(runs >= 0)[0]
+    g = glucose[index]
+    r = runs[index]
+    keep = np.ones(index.shape[0], dtype=bool)
+    inner = (r[1:-1] == r[:-2]) & (r[1:-1] == r[2:])
+    rising = (g[:-2] < g[1:-1]) & (g[1:-1] < g[2:])
+    falling = (g[:-2] > g[1:-1]) & (g[1:-1] > g[2:])
+    keep[1:-1] = ~(inner & (rising | falling))
+    return g[keep], r[keep]
+
+
+def get_excursions(values, threshold):
+    ## amplitudes of the swings larger than threshold, a peak or nadir is
+    ## confirmed once the glucose has moved back by more than threshold.
+    ## The swing still open at the end is never confirmed and not counted.
+    amplitudes = []
+    low = high = values[0]
+    direction = 0
+    for value in values[1:]:
+        if direction == 0:
+            low = min(low, value)
+            high = max(high, value)
+            if high - low > threshold:
+                direction = 1 if value == high else -1
+                pivot = low if direction == 1 else high
+                extreme = value
+        elif direction * (value - extreme) > 0:
+            extreme = value
+        elif direction * (extreme - value) > threshold:
+            amplitudes.append(abs(extreme - pivot))
+            pivot, extreme, direction = extreme, value, -direction
+    return amplitudes
+
+
+def get_mage(glucose, runs, threshold):
+    ## mean amplitude of the excursions larger than threshold (one SD),
+    ## counting rises and falls, each run on its own
+    values, run_ids = get_turning_points(glucose, runs)
+    if values.shape[0] == 0:
+        return np.nan
+    bounds = np.where(np.diff(run_ids) != 0)[0] + 1
+    amplitudes = []
+    for part in np.split(values, bounds):
+        amplitudes.extend(get_excursions(part.tolist(), threshold))
+    return np.mean(amplitudes) if amplitudes else np.nan
+
+
+def get_risk_indices(glucose):
+    ## Kovatchev low and high blood glucose indices
+    f = 1.509 * (np.log(glucose * mg_per_mmol) ** 1.084 - 5.381)
+    risk = 10 * f ** 2
+    return (np.mean(np.where(f < 0, risk, 0)),
+            np.mean(np.where(f > 0, risk, 0)))
+
+
+def get_metric_columns(conga_hours=1):
+    return ['Minutes', 'Mean (mmol/L)', 'SD (mmol/L)', 'CV (%)',
+            'MAGE (mmol/L)', 'CONGA-{:g} (mmol/L)'.format(conga_hours),
+            'MODD (mmol/L)', 'J-index', 'LBGI', 'HBGI']
+
+
+def compute_metrics(cgm_data, mask=None, conga_hours=1):
+    ## one row of variability metrics for the grid points inside mask
+    glucose = cgm_data['Glucose (mmol/L)'].values.astype(float)
+    runs = get_runs(glucose, cgm_data['segment'].values, mask)
+    valid = runs >= 0
+    columns = get_metric_columns(conga_hours)
+    if not valid.any():
+        return pd.Series([0] + [np.nan] * (len(columns) - 1), index=columns)
+
+    values = glucose[valid]
+    mean = values.mean()
+    sd = values.std(ddof=1) if values.shape[0] > 1 else np.nan
+    conga = lag_differences(glucose, valid, int(round(conga_hours * 60)))
+    modd = lag_differences(glucose, valid, 24 * 60)
+    lbgi, hbgi = get_risk_indices(values)
+    return pd.Series([
+        values.shape[0],
+        mean,
+        sd,
+        100 * sd / mean,
+        get_mage(glucose, runs, sd) if sd > 0 else np.nan,
+        conga.std(ddof=1) if conga.shape[0] > 1 else np.nan,
+        np.abs(modd).mean() if modd.shape[0] else np.nan,
+        0.001 * (mg_per_mmol * (mean + sd)) ** 2,
+        lbgi,
+        hbgi,
+        ], index=columns)
+
+
+def get_metrics(users=None, subsets=None, conga_hours=1, compact=False):
+    ## table of metrics indexed by user and subset. subsets maps a name to
+    ## None (all data) or to a function of the cgm data returning a mask,
+    ## e.g. {'sleep' : lambda cgm_data: cgm_data['is_sleep'].values}. With
+    ## compact=True the grids are compact frames, read their columns with
+    ## compact.get_column
+    subsets = subsets or OrderedDict([('all', None)])
+    rows = OrderedDict()
+    for user in users or sorted(config):
+        records, cgm_data = get_data(user, compact=compact)
+        for name, get_mask in subsets.items():
+            mask = None if get_mask is None else get_mask(cgm_data)
+            rows[(user, name)] = compute_metrics(cgm_data, mask=mask,
+                                                 conga_hours=conga_hours)
+    table = pd.DataFrame(list(rows.values()),
+                         columns=get_metric_columns(conga_hours),
+                         index=pd.MultiIndex.from_tuples(
+                                    list(rows), names=['User', 'Subset']))
+    table['Minutes'] = table['Minutes'].astype(int)
+    return table
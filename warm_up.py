@@ -0,0 +1,78 @@
+import os
+import sys
+import time
+import traceback
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from read_data import open_data, load_libre_data, libre_source, config
+
+## Builds the cached stores of many users at once. The shared Libre export
+## is parsed once in the parent and inherited by forked workers; the
+## workers then read records files, interpolate, label and write their
+## stores side by side, so one user's file reads overlap another's
+## processing. Stores are written under a temporary name and renamed into
+## place (see column_store.write_columns), so concurrent runs never see a
+## half written cache.
+
+
+def get_pool(workers=None):
+    ## with fork the workers inherit the stores and the parsed export of
+    ## the parent, elsewhere they open and parse them again
+    if 'fork' in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context('fork')
+    else:
+        context = multiprocessing.get_context()
+    return ProcessPoolExecutor(max_workers=workers, mp_context=context)
+
+
+def build_user(user, incremental=False, user_config=None):
+    ## (key, grid minutes, seconds), errors are returned as a traceback so
+    ## one bad user does not stop the others
+    if user_config is not None:
+        config[user] = user_config
+    start = time.perf_counter()
+    try:
+        key, (records_store, cgm_store) = open_data(user,
+                                                    incremental=incremental)
+    except Exception:
+        return traceback.format_exc()
+    return key, cgm_store[0]['length'], time.perf_counter() - start
+
+
+def warm_up(users=None, workers=None, incremental=False):
+    users = users or sorted(config)
+    if not os.path.exists(os.path.join('data', 'pkl')):
+        os.makedirs(os.path.join('data', 'pkl'))
+    load_libre_data(os.path.join('data', 'raw', libre_source['file']))
+
+    errors = {}
+    with get_pool(workers) as pool:
+        futures = {pool.submit(build_user, user, incremental,
+                               config[user]) : user
+                   for user in users}
+        for n, future in enumerate(as_completed(futures)):
+            user = futures[future]
+            try:
+                result = future.result()
+            except Exception:
+                result = traceback.format_exc()
+            if isinstance(result, str):
+                errors[user] = result
+                print('[{}/{}] {} failed'.format(n + 1, len(futures), user))
+                continue
+            key, length, seconds = result
+            print('[{}/{}] {} {} ({} minutes, {:.1f} s)'.format(
+                        n + 1, len(futures), user, key, length, seconds))
+
+    ## the parent opens the finished stores for later use
+    for user in users:
+        if user not in errors:
+            open_data(user)
+    for user, error in sorted(errors.items()):
+        sys.stderr.write('{} failed:\n{}\n'.format(user, error))
+    return errors
+
+
+if __name__ == '__main__':
+    errors = warm_up()
+    sys.exit(1 if errors else 0)